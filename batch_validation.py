@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pre-flight Batch Validation
+Checks the whole parsed batch before any Okta write and splits it into
+ready / needs-attention / invalid users. Only ready users are provisioned.
+Soft data problems (no manager email, odd US state or zip, single-word
+name) are reported as warnings; those users are still provisioned, as
+they always have been.
+"""
+
+import logging
+import re
+from typing import Dict, List, Tuple
+from ticket_extractor import REQUIRED_ADDRESS_FIELDS, US_STATE_TIMEZONES
+
+logger = logging.getLogger(__name__)
+
+US_ZIP_RE = re.compile(r"^\d{5}(-\d{4})?$")
+# Characters that never belong in a person's name (usually a pasted email or ticket text)
+BAD_NAME_RE = re.compile(r"[@\d<>/\\]")
+
+# Issue codes that mean "the login already exists in Okta" rather than a data problem
+DUPLICATE_ISSUE = "login already exists in Okta"
+# Prefix of the issue for a department that maps to no Okta group
+UNKNOWN_DEPARTMENT_ISSUE = "unknown department"
+
+
+class BatchValidationResult:
+    """Outcome of validate_batch; each non-ready entry carries its list of issues."""
+
+    def __init__(self):
+        self.ready: List[Dict] = []
+        # Ready users whose ticket data looks off; provisioned anyway
+        self.warnings: List[Tuple[Dict, List[str]]] = []
+        self.needs_attention: List[Tuple[Dict, List[str]]] = []
+        self.invalid: List[Tuple[Dict, List[str]]] = []
+
+    @property
+    def duplicates(self) -> List[Dict]:
+        return [user for user, issues in self.needs_attention if DUPLICATE_ISSUE in issues]
+
+    def summary(self) -> str:
+        return (f"{len(self.ready)} ready ({len(self.warnings)} with warnings), "
+                f"{len(self.needs_attention)} need attention, {len(self.invalid)} invalid")
+
+
+def check_static(user: Dict) -> Tuple[List[str], List[str]]:
+    """Checks that depend only on the ticket data. Returns (invalid issues, warnings)."""
+    invalid, warnings = [], []
+
+    name = (user.get("name") or "").strip()
+    if not name:
+        invalid.append("missing name")
+    elif BAD_NAME_RE.search(name):
+        invalid.append(f"name looks wrong: '{name}'")
+    elif len(name.split()) < 2:
+        warnings.append(f"name has no last name: '{name}'")
+
+    if not user.get("department"):
+        invalid.append("missing department")
+
+    missing_address = [f for f in REQUIRED_ADDRESS_FIELDS if not user.get(f)]
+    if missing_address:
+        invalid.append(f"missing address fields: {', '.join(missing_address)}")
+    elif user.get("countryCode") == "US":
+        if user.get("state") not in US_STATE_TIMEZONES:
+            warnings.append(f"unknown US state: '{user.get('state')}'")
+        if not US_ZIP_RE.match(str(user.get("zipCode", "")).strip()):
+            warnings.append(f"invalid US zip code: '{user.get('zipCode')}'")
+
+    if not user.get("manager_email"):
+        warnings.append("missing manager email (Reports to)")
+
+    return invalid, warnings
+
+
+def validate_batch(users: List[Dict], resolver, allocator, parse_cache=None) -> BatchValidationResult:
+    """Validate every user against the group mappings, the login index and address rules.
+
+    Logins are only allocated for users that pass the other checks, so
+    rejected tickets never reserve an email address. With *parse_cache*
+    (a ParseCache), static checks for unchanged tickets are reused.
+    """
+    result = BatchValidationResult()
+    candidates = []
+
+    warned = {}
+    for user in users:
+        if parse_cache:
+            invalid, warnings = parse_cache.check_static(user, check_static, getattr(resolver, "version", ""))
+        else:
+            invalid, warnings = check_static(user)
+        attention = []
+        if user.get("department") and not resolver.groups_for(user.get("department")):
+            attention.append(f"{UNKNOWN_DEPARTMENT_ISSUE}: '{user.get('department')}'")
+        if invalid:
+            result.invalid.append((user, invalid + attention + warnings))
+        elif attention:
+            result.needs_attention.append((user, attention + warnings))
+        else:
+            candidates.append(user)
+            if warnings:
+                warned[id(user)] = warnings
+
+    allocations = allocator.allocate_batch(candidates)
+    for user in candidates:
+        allocation = allocations.get(str(user.get("ticket_number")))
+        if allocation and allocation.reason == "existing":
+            result.needs_attention.append((user, [DUPLICATE_ISSUE]))
+            continue
+        if allocation and allocation.reason == "alternate":
+            logger.info(f" Login {allocation.base_email} is taken, using {allocation.email} "
+                        f"(Ticket #{user.get('ticket_number')})")
+        result.ready.append(user)
+        if id(user) in warned:
+            result.warnings.append((user, warned[id(user)]))
+
+    return result
@@ -0,0 +1,73 @@
+# cache_store.py
+"""
+Small helpers for the on-disk caches kept under ./cache.
+
+Writes go to a temp file first and are then renamed into place, so a crash
+mid-write never leaves a half-written cache behind.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# OKTA_CACHE_DIR points a run at another cache folder (e.g. a snapshot for replay benchmarks)
+CACHE_DIR = os.getenv('OKTA_CACHE_DIR') or os.path.join(os.path.dirname(__file__), 'cache')
+
+
+# Left out of scratch copies: the HTTP cache is bypassed during replay, and
+# coordination.db holds the live run lease and work queue
+SCRATCH_SKIP = ('http', 'coordination.db', 'coordination.db-wal', 'coordination.db-shm')
+
+
+def use_scratch_copy() -> str:
+    """Redirect every cache read/write to a temporary copy of CACHE_DIR and return its path.
+
+    Used by replay runs, so replayed state never overwrites the real caches,
+    carry-over or notification spill. The caller removes the folder.
+    """
+    global CACHE_DIR
+    scratch = tempfile.mkdtemp(prefix='okta_cache_')
+    if os.path.isdir(CACHE_DIR):
+        shutil.copytree(CACHE_DIR, scratch, dirs_exist_ok=True,
+                        ignore=lambda _, names: [n for n in names if n in SCRATCH_SKIP])
+    logger.info(f"Using scratch cache folder {scratch} (copy of {CACHE_DIR})")
+    CACHE_DIR = scratch
+    return scratch
+
+
+def cache_path(name: str) -> str:
+    """Return the full path of a cache file under CACHE_DIR."""
+    return os.path.join(CACHE_DIR, name)
+
+
+def load_json(name: str, default: Any = None) -> Any:
+    """Load a JSON cache file, returning *default* if it is missing or unreadable."""
+    path = cache_path(name)
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file {name}: {str(e)}")
+        return default
+
+
+def save_json(name: str, data: Any) -> bool:
+    """Atomically write *data* to a JSON cache file."""
+    path = cache_path(name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to write cache file {name}: {str(e)}")
+        return False
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Department Resolution
+Maps free-text ticket department strings ("customer success ", "CS",
+"Account Executives") to the canonical DEPARTMENT_GROUP_MAPPING keys.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Extra aliases that can't be derived from the mapping keys.
+# Targets must be DEPARTMENT_GROUP_MAPPING keys; unknown targets are ignored.
+DEPARTMENT_ALIASES = {
+    "CS": "Customer Success",
+    "Support": "Chat Support",
+    "Human Resources": "HR",
+    "People Ops": "HR",
+    "R&D": "Research & Development",
+    "Engineering": "Research & Development",
+    "SDR": "SDR - Sales Development Reps",
+    "Sales Ops": "Sales Operations",
+    "Account Management": "Account Manager",
+    "Information Technology": "IT",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = {"and", "of", "the"}
+
+
+def normalize_department(text: str) -> str:
+    """Case-fold, drop punctuation and plurals so equivalent spellings share one key."""
+    words = _WORD_RE.findall(text.casefold().replace("&", " and "))
+    # "Executives" and "Executive" should match; applied to both sides so it stays consistent
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+
+def _acronym(text: str) -> str:
+    words = [w for w in _WORD_RE.findall(text.casefold().replace("&", " and ")) if w not in _STOP_WORDS]
+    return "".join(w[0] for w in words) if len(words) > 1 else ""
+
+
+class DepartmentResolver:
+    """Normalized, alias-aware department lookup built once from the group mapping.
+
+    Resolutions are memoized per raw string, and group lists per canonical
+    department, so repeated tickets cost a dict lookup.
+    """
+
+    def __init__(self, mapping: Dict, aliases: Optional[Dict[str, str]] = None, groups_lookup=None):
+        self.departments = list(mapping)
+        aliases = aliases if aliases is not None else DEPARTMENT_ALIASES
+        # Changes whenever the mapping or aliases do (cached validation results key on it)
+        self.version = hashlib.sha1(json.dumps([mapping, aliases], sort_keys=True, default=str)
+                                    .encode("utf-8")).hexdigest()[:12]
+        self._groups_lookup = groups_lookup
+        self._table: Dict[str, str] = {}
+        self._memo: Dict[str, Optional[str]] = {}
+        self._groups_memo: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._build(aliases)
+
+    def _build(self, aliases: Dict[str, str]) -> None:
+        # Exact names always win; derived keys are only used when unambiguous
+        derived = defaultdict(set)
+        for department in self.departments:
+            self._table[normalize_department(department)] = department
+            for part in department.split(" - "):
+                derived[normalize_department(part)].add(department)
+            acronym = _acronym(department)
+            if acronym:
+                derived[acronym].add(department)
+        for key, targets in derived.items():
+            if key and key not in self._table and len(targets) == 1:
+                self._table[key] = next(iter(targets))
+        for alias, target in aliases.items():
+            if target in self.departments:
+                self._table.setdefault(normalize_department(alias), target)
+
+    def resolve(self, department: Optional[str]) -> Optional[str]:
+        """Return the canonical department for a ticket string, or None if unknown."""
+        if not department:
+            return None
+        if department in self._memo:
+            return self._memo[department]
+        canonical = self._table.get(normalize_department(department))
+        with self._lock:
+            self._memo[department] = canonical
+        return canonical
+
+    def groups_for(self, department: Optional[str]) -> List[str]:
+        """Return the group IDs for a ticket department string ([] if unknown)."""
+        # Strings we can't resolve still go to the lookup as-is once, so
+        # anything config.get_groups_for_department already handles keeps working
+        key = self.resolve(department) or department
+        if not key:
+            return []
+        if key not in self._groups_memo:
+            groups = self._groups_lookup(key) if self._groups_lookup else []
+            with self._lock:
+                self._groups_memo[key] = list(groups or [])
+        return self._groups_memo[key]
+
+    def find_unresolved(self, users: Iterable[Dict]) -> Dict[str, List]:
+        """Return {department string: [ticket numbers]} for users whose department maps to no groups."""
+        unresolved = defaultdict(list)
+        for user in users:
+            department = user.get("department")
+            if not self.groups_for(department):
+                unresolved[department or "(none)"].append(user.get("ticket_number"))
+        return dict(unresolved)
+
+
+_default_resolver: Optional[DepartmentResolver] = None
+_default_lock = threading.Lock()
+
+
+def get_resolver() -> DepartmentResolver:
+    """Return the process-wide resolver, built from config on first use."""
+    global _default_resolver
+    with _default_lock:
+        if _default_resolver is None:
+            from config import DEPARTMENT_GROUP_MAPPING, get_groups_for_department
+            _default_resolver = DepartmentResolver(DEPARTMENT_GROUP_MAPPING, groups_lookup=get_groups_for_department)
+        return _default_resolver
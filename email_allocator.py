@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Work Email Allocation
+Picks a free firstlast@filevine.com login for each new hire, checking
+candidates against a preloaded set of existing Okta logins.
+"""
+
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+EMAIL_DOMAIN = "filevine.com"
+MAX_NUMERIC_SUFFIX = 99
+
+# Statuses whose login may be re-issued to a different person (a rehire with
+# the same name, or an unrelated new hire) by allocating an alternate
+RECYCLED_STATUSES = {"DEPROVISIONED"}
+
+
+class Allocation(NamedTuple):
+    email: str
+    base_email: str
+    # "base": the plain firstlast login was free
+    # "alternate": the plain login was taken, a deterministic alternate was chosen
+    # "existing": a live Okta account already belongs to this same hire (matched on
+    # the personal email stored on the account)
+    reason: str
+
+
+@lru_cache(maxsize=4096)
+def normalize_name_part(part: str) -> str:
+    """Lower-case a name part and strip accents, hyphens, apostrophes and spaces."""
+    decomposed = unicodedata.normalize("NFKD", part)
+    return "".join(c for c in decomposed if c.isascii() and c.isalnum()).lower()
+
+
+@lru_cache(maxsize=4096)
+def split_name(full_name: str) -> Tuple[str, str, str, str]:
+    """Return normalized (first, rest, middle initials, last word) for a full name.
+
+    first + rest is the login logins have always used ("Mary Ann Smith" ->
+    "maryannsmith"); the middle initials and last word build the
+    middle-initial alternate ("maryasmith").
+    """
+    parts = [normalize_name_part(p) for p in full_name.strip().split()]
+    parts = [p for p in parts if p]
+    if not parts:
+        return "", "", "", ""
+    first, others = parts[0], parts[1:]
+    middle = "".join(p[0] for p in others[:-1])
+    last = others[-1] if others else ""
+    return first, "".join(others), middle, last
+
+
+class EmailAllocator:
+    """Allocate collision-free work emails in O(1) per candidate.
+
+    *existing* maps local part (the bit before @) to its Okta status and
+    *owners* maps local part to the personal email stored on that account.
+    Logins allocated by this allocator are added as they are handed out,
+    so two hires with the same name in one batch get different logins.
+    """
+
+    def __init__(self, existing: Optional[Dict[str, str]] = None, domain: str = EMAIL_DOMAIN,
+                 owners: Optional[Dict[str, str]] = None):
+        self.domain = domain
+        self._existing: Dict[str, str] = dict(existing or {})
+        self._owners: Dict[str, str] = {local: email.lower() for local, email in (owners or {}).items() if email}
+        self._allocated = set()
+
+    @classmethod
+    def from_directory(cls, directory, domain: str = EMAIL_DOMAIN) -> "EmailAllocator":
+        """Build an allocator from an OktaUserDirectory."""
+        suffix = f"@{domain}"
+        existing, owners = {}, {}
+        for login, info in directory.users.items():
+            if login.endswith(suffix):
+                existing[login[:-len(suffix)]] = info.get("status") or "UNKNOWN"
+                if info.get("second_email"):
+                    owners[login[:-len(suffix)]] = info["second_email"]
+        return cls(existing, domain, owners)
+
+    def _taken(self, local: str) -> bool:
+        return local in self._allocated or local in self._existing
+
+    def _live(self, local: str) -> bool:
+        status = self._existing.get(local)
+        return local not in self._allocated and status is not None and status not in RECYCLED_STATUSES
+
+    def candidates(self, full_name: str) -> Iterable[str]:
+        """Yield candidate local parts in a fixed order: base, middle initial, numeric suffixes."""
+        first, rest, middle, last = split_name(full_name)
+        base = first + rest
+        yield base
+        if middle:
+            yield f"{first}{middle}{last}"
+        for n in range(2, MAX_NUMERIC_SUFFIX + 1):
+            yield f"{base}{n}"
+
+    def allocate(self, full_name: str, personal_email: Optional[str] = None) -> Allocation:
+        """Pick a login for *full_name* and reserve it.
+
+        *personal_email* identifies the hire: a live account carrying it is
+        theirs ("existing"). Any other live account with the same name - a
+        different personal email, or one that can't be compared - is treated
+        as someone else and the hire gets an alternate.
+        """
+        candidates = list(self.candidates(full_name))
+        base = candidates[0]
+        base_email = f"{base}@{self.domain}"
+        personal = (personal_email or "").strip().lower()
+
+        if personal:
+            # This hire's account from an earlier run, possibly on an alternate login
+            for local in candidates:
+                if self._live(local) and self._owners.get(local) == personal:
+                    return Allocation(f"{local}@{self.domain}", base_email, "existing")
+
+        if not self._taken(base):
+            self._allocated.add(base)
+            return Allocation(base_email, base_email, "base")
+
+        for local in candidates[1:]:
+            if not self._taken(local):
+                self._allocated.add(local)
+                return Allocation(f"{local}@{self.domain}", base_email, "alternate")
+        raise ValueError(f"No free login for {full_name} after {MAX_NUMERIC_SUFFIX} alternates")
+
+    def allocate_batch(self, users: List[Dict]) -> Dict[str, Allocation]:
+        """Allocate logins for a batch in a stable order (oldest ticket first).
+
+        Sets user["work_email"] and returns allocations keyed by ticket number.
+        """
+        allocations = {}
+        ordered = sorted(users, key=lambda u: (str(u.get("ticket_created", "")), str(u.get("ticket_number", ""))))
+        for user in ordered:
+            if not user.get("name", "").strip():
+                continue
+            allocation = self.allocate(user["name"], user.get("personal_email"))
+            user["work_email"] = allocation.email
+            allocations[str(user.get("ticket_number"))] = allocation
+        return allocations
@@ -4,8 +4,9 @@ Helper script to fetch all Okta groups and their IDs for easy configuration.
 Run this script to get the group IDs you need to update in config.py
 """
 
-import requests
-from config import get_okta_token, OKTA_ORG_URL
+import sys
+from config import get_okta_token
+from group_catalog import GroupCatalog
 
 def get_all_okta_groups():
     """Fetch all Okta groups and display them for configuration."""
@@ -21,29 +22,10 @@ def get_all_okta_groups():
             "Accept": "application/json"
         }
         
-        # Get all groups
+        # Get all groups (all pages, cached for a day in cache/okta_group_catalog.json)
         print(" Fetching all Okta groups...")
-        url = f"{OKTA_ORG_URL}/api/v1/groups"
-        
-        all_groups = []
-        next_url = url
-        
-        while next_url:
-            response = requests.get(next_url, headers=headers)
-            response.raise_for_status()
-            
-            groups = response.json()
-            all_groups.extend(groups)
-            
-            # Check for pagination
-            link_header = response.headers.get('link', '')
-            next_url = None
-            if 'rel="next"' in link_header:
-                # Parse next URL from link header
-                for link in link_header.split(','):
-                    if 'rel="next"' in link:
-                        next_url = link.split('<')[1].split('>')[0]
-                        break
+        catalog = GroupCatalog.load(headers, force_refresh="--refresh" in sys.argv)
+        all_groups = list(catalog.groups)
         
         print(f"\n Found {len(all_groups)} groups in your Okta org\n")
         print("=" * 80)
@@ -56,7 +38,7 @@ def get_all_okta_groups():
         for group in all_groups:
             group_id = group['id']
             group_name = group['profile']['name']
-            description = group['profile'].get('description', 'No description')
+            description = group['profile'].get('description') or 'No description'
             
             print(f" {group_name}")
             print(f"   ID: {group_id}")
@@ -90,16 +72,11 @@ def get_all_okta_groups():
         
         for dept in departments_needed:
             print(f" {dept}:")
-            matches = []
-            
-            for group in all_groups:
-                group_name = group['profile']['name']
-                if dept.lower() in group_name.lower():
-                    matches.append(f"    '{group_name}' -> {group['id']}")
+            matches = catalog.suggest(dept)
             
             if matches:
-                for match in matches:
-                    print(match)
+                for group, score in matches:
+                    print(f"    '{group['profile']['name']}' -> {group['id']} (match {score:.2f})")
             else:
                 print(f"   No obvious match found - check manually")
             print()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Okta Group Catalog
+Fetches every Okta group once (all pages), caches the catalog on disk and
+indexes group names for fast department -> group suggestions.
+"""
+
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from config import OKTA_ORG_URL
+from cache_store import load_json, save_json
+from okta_api import iter_pages
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_FILE = "okta_group_catalog.json"
+CATALOG_MAX_AGE_HOURS = 24
+PAGE_LIMIT = 200
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> Set[str]:
+    return set(_TOKEN_RE.findall(text.lower().replace("&", " and ")))
+
+
+def _trigrams(text: str) -> Set[str]:
+    compact = " " + " ".join(_TOKEN_RE.findall(text.lower())) + " "
+    return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+
+class GroupCatalog:
+    """All Okta groups with a by-id map and token/trigram indexes over group names."""
+
+    def __init__(self, groups: List[Dict], fetched_at: Optional[str] = None):
+        self.groups = groups
+        self.fetched_at = fetched_at
+        self.by_id: Dict[str, Dict] = {g["id"]: g for g in groups}
+        self._token_index: Dict[str, Set[int]] = defaultdict(set)
+        self._trigram_index: Dict[str, Set[int]] = defaultdict(set)
+        self._trigram_counts: List[int] = []
+        for i, group in enumerate(groups):
+            name = group["profile"]["name"]
+            for token in _tokens(name):
+                self._token_index[token].add(i)
+            grams = _trigrams(name)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigram_index[gram].add(i)
+
+    @classmethod
+    def fetch(cls, headers: Dict[str, str]) -> "GroupCatalog":
+        """Fetch every group from Okta, prefetching the next page while the current one is processed."""
+        groups = []
+        for page in iter_pages(f"{OKTA_ORG_URL}/api/v1/groups", headers, {"limit": PAGE_LIMIT}, cache=True):
+            for group in page:
+                profile = group.get("profile", {})
+                # Keep only what we use so the cache stays small
+                groups.append({
+                    "id": group["id"],
+                    "profile": {
+                        "name": profile.get("name", ""),
+                        "description": profile.get("description"),
+                    },
+                })
+        catalog = cls(groups, datetime.now().isoformat(timespec="seconds"))
+        save_json(CATALOG_CACHE_FILE, {"fetched_at": catalog.fetched_at, "groups": groups})
+        logger.info(f"Fetched {len(groups)} Okta groups into the group catalog")
+        return catalog
+
+    @classmethod
+    def load(cls, headers: Dict[str, str], max_age_hours: float = CATALOG_MAX_AGE_HOURS,
+             force_refresh: bool = False) -> "GroupCatalog":
+        """Return the cached catalog if it is fresh enough, otherwise fetch it from Okta."""
+        if not force_refresh:
+            data = load_json(CATALOG_CACHE_FILE)
+            if data and data.get("fetched_at"):
+                try:
+                    age = datetime.now() - datetime.fromisoformat(data["fetched_at"])
+                except ValueError:
+                    age = None
+                if age is not None and age < timedelta(hours=max_age_hours):
+                    return cls(data.get("groups", []), data["fetched_at"])
+        return cls.fetch(headers)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def get(self, group_id: str) -> Optional[Dict]:
+        return self.by_id.get(group_id)
+
+    def suggest(self, department: str, limit: int = 5) -> List[Tuple[Dict, float]]:
+        """Return up to *limit* (group, score) pairs whose names best match *department*.
+
+        Scores favour shared whole words and fall back to trigram overlap, so
+        "Account Executive" still finds "Account Executives - Sales".
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        dept_tokens = _tokens(department)
+        for token in dept_tokens:
+            for i in self._token_index.get(token, ()):
+                scores[i] += 1.0 / len(dept_tokens)
+
+        dept_grams = _trigrams(department)
+        gram_hits: Dict[int, int] = defaultdict(int)
+        for gram in dept_grams:
+            for i in self._trigram_index.get(gram, ()):
+                gram_hits[i] += 1
+        for i, hits in gram_hits.items():
+            # Dice coefficient over trigrams, weighted below whole-word matches
+            scores[i] += 0.5 * (2.0 * hits / (len(dept_grams) + self._trigram_counts[i]))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.groups[item[0]]["profile"]["name"].lower()))
+        return [(self.groups[i], round(score, 3)) for i, score in ranked[:limit] if score >= 0.25]
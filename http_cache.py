@@ -0,0 +1,246 @@
+# http_cache.py
+"""
+On-disk HTTP response cache for conditional GETs.
+
+Bodies and their validators (ETag / Last-Modified) are kept under
+./cache/http. http_client sends If-None-Match / If-Modified-Since for cached
+URLs and serves a 304 from the stored body, so unchanged group lists cost
+one round trip and no download. The cache is bounded by total body size
+and evicts least recently used entries. Samanage ticket pages are never
+stored (UNCACHED_PATHS).
+
+Helper and worker processes on the same host share the directory. Each
+save merges this process's index into the one on disk under a file lock,
+so no process drops another's entries and the size cap covers them all.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+from cache_store import cache_path
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_DIR = cache_path("http")
+HTTP_CACHE_MAX_BYTES = 50 * 1024 * 1024
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+# Body files no index knows about (a process died between writing the body and
+# saving the index) are removed once they are this old
+ORPHAN_BODY_SECONDS = 3600
+# Response headers kept with the body (Link carries Okta's pagination cursor)
+STORED_HEADERS = ("Content-Type", "Link", "ETag", "Last-Modified")
+# Request headers that change the representation and so belong in the key
+VARY_HEADERS = ("Accept",)
+# Never written to disk, even if a caller asks: Samanage tickets carry requester PII
+UNCACHED_PATHS = ("/incidents",)
+
+
+def _uncached(url: str) -> bool:
+    return any(fragment in url for fragment in UNCACHED_PATHS)
+
+
+class HttpCache:
+    """Size-bounded LRU store of GET bodies keyed by URL, params and Accept header."""
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict] = self._load_index()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "bytes_saved": 0}
+
+    # --- index ------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index across processes sharing the directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a+b") as f:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict[str, Dict]:
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable HTTP cache index: {str(e)}")
+            return {}
+
+    def _load_index(self) -> Dict[str, Dict]:
+        index = self._read_index()
+        if not index:
+            return {}
+        # Remove bodies stored before their path was excluded (e.g. ticket pages from older versions)
+        purged = [key for key, entry in index.items() if _uncached(entry.get("url", ""))]
+        for key in purged:
+            del index[key]
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+        if purged:
+            logger.info(f"Removed {len(purged)} uncacheable responses from the HTTP cache")
+            with self._lock:
+                self._index = index
+                self._save_index()
+        return index
+
+    def _save_index(self) -> None:
+        """Merge with the index on disk, evict down to the size cap and write it back."""
+        # Caller holds the lock
+        try:
+            with self._file_lock():
+                merged = self._read_index()
+                for key, entry in self._index.items():
+                    current = merged.get(key)
+                    if current is None or entry.get("last_used", 0) >= current.get("last_used", 0):
+                        merged[key] = entry
+                # Entries whose body another process evicted are gone for everyone
+                self._index = {key: entry for key, entry in merged.items()
+                               if os.path.exists(self._body_path(key))}
+                self._evict()
+                self._sweep_orphans()
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self._index, f)
+                os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+        except Exception as e:
+            logger.error(f"Failed to write HTTP cache index: {str(e)}")
+
+    def _sweep_orphans(self) -> None:
+        # Caller holds the lock and the file lock
+        cutoff = time.time() - ORPHAN_BODY_SECONDS
+        for name in os.listdir(self.directory):
+            if not name.endswith(".body") or name[:-len(".body")] in self._index:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.body")
+
+    # --- lookups ----------------------------------------------------------
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> str:
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        vary = "|".join(f"{h}={(headers or {}).get(h, '')}" for h in VARY_HEADERS)
+        return hashlib.sha256(f"{url}?{query}#{vary}".encode("utf-8")).hexdigest()[:32]
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Return the index entry for *key* if its body is still on disk."""
+        with self._lock:
+            entry = self._index.get(key)
+        if entry and os.path.exists(self._body_path(key)):
+            return entry
+        return None
+
+    @staticmethod
+    def validators(entry: Dict) -> Dict[str, str]:
+        headers = {}
+        stored = entry.get("headers", {})
+        if stored.get("ETag"):
+            headers["If-None-Match"] = stored["ETag"]
+        if stored.get("Last-Modified"):
+            headers["If-Modified-Since"] = stored["Last-Modified"]
+        return headers
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Body for a 304, marking the entry as recently used."""
+        try:
+            with open(self._body_path(key), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index[key]["last_used"] = time.time()
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(body)
+        return body
+
+    def store(self, key: str, url: str, body: bytes, headers) -> None:
+        """Keep a 200 body if the response carries a validator."""
+        if _uncached(url):
+            return
+        kept = {h: headers.get(h) for h in STORED_HEADERS if headers.get(h)}
+        if "ETag" not in kept and "Last-Modified" not in kept:
+            with self._lock:
+                self.stats["misses"] += 1
+            return
+        if len(body) > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self._body_path(key))
+        except OSError as e:
+            logger.warning(f"Could not cache response for {url}: {str(e)}")
+            return
+        with self._lock:
+            self._index[key] = {"url": url, "headers": kept, "size": len(body), "last_used": time.time()}
+            self.stats["misses"] += 1
+            self.stats["stored"] += 1
+            self._save_index()
+
+    def _evict(self) -> None:
+        # Caller holds the lock
+        total = sum(entry.get("size", 0) for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= entry.get("size", 0)
+            del self._index[key]
+            self.stats["evicted"] += 1
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        """Persist last-used times (called from http_client.log_stats at the end of a run)."""
+        with self._lock:
+            self._save_index()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._index),
+                "bytes": sum(entry.get("size", 0) for entry in self._index.values()),
+            }
@@ -0,0 +1,249 @@
+# http_cassette.py
+"""
+Record/replay of every outbound HTTP call (Samanage, Okta, Slack).
+
+In record mode each request that reaches the network is saved with its
+response and latency to a gzipped JSON-lines cassette. Credentials are
+never written: request headers are not stored, and query parameters and
+JSON keys that look like secrets are replaced with "[scrubbed]". In replay
+mode the same calls are answered from the cassette with the original
+latency, divided by *speed* (0 = no delay), so a whole run can be
+benchmarked offline and compared between versions.
+
+Replay matches on method, URL, query and body. Calls whose body or query
+changed between runs (timestamps, incremental-sync filters) fall back to
+the next unused recording for the same method and URL, then for the same
+path. Anything left unmatched raises CassetteMiss, a ConnectionError, so
+the normal network-error handling applies.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+SCRUBBED = "[scrubbed]"
+# Query parameters and JSON keys whose values are never written to a cassette
+SECRET_KEY_PATTERN = re.compile(r"token|secret|password|passwd|api[_-]?key|authorization|signature|sig$|credential",
+                                re.IGNORECASE)
+# Response headers kept (pagination, caching, rate limits); everything else is dropped
+KEPT_RESPONSE_HEADERS = ("Content-Type", "Link", "ETag", "Last-Modified", "Retry-After",
+                         "X-Rate-Limit-Limit", "X-Rate-Limit-Remaining", "X-Rate-Limit-Reset")
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Replay found no recorded response for a request."""
+
+
+def scrub(value):
+    """Copy of a JSON value with secret-looking keys blanked."""
+    if isinstance(value, dict):
+        return {k: SCRUBBED if SECRET_KEY_PATTERN.search(str(k)) else scrub(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(v) for v in value]
+    return value
+
+
+def _scrub_query(pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    return sorted((k, SCRUBBED if SECRET_KEY_PATTERN.search(k) else str(v)) for k, v in pairs)
+
+
+def _normalize(url: str, params=None) -> Tuple[str, str, str]:
+    """(scheme://host/path, scrubbed sorted query, path) for matching and storage."""
+    parts = urlsplit(url)
+    pairs = parse_qsl(parts.query, keep_blank_values=True)
+    if isinstance(params, dict):
+        for key, value in params.items():
+            for item in (value if isinstance(value, (list, tuple)) else [value]):
+                pairs.append((key, str(item)))
+    elif params:
+        pairs.extend((k, str(v)) for k, v in params)
+    base = urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+    return base, urlencode(_scrub_query(pairs)), parts.path
+
+
+def _body_digest(kwargs: Dict) -> str:
+    if kwargs.get("json") is not None:
+        content = json.dumps(scrub(kwargs["json"]), sort_keys=True, default=str).encode("utf-8")
+    elif kwargs.get("data") is not None:
+        data = kwargs["data"]
+        if isinstance(data, dict):
+            content = json.dumps(scrub(data), sort_keys=True, default=str).encode("utf-8")
+        else:
+            content = data if isinstance(data, bytes) else str(data).encode("utf-8")
+    else:
+        return ""
+    return hashlib.sha1(content).hexdigest()[:16]
+
+
+def _encode_body(body: bytes, content_type: str) -> Dict:
+    if "json" in (content_type or ""):
+        try:
+            return {"json": scrub(json.loads(body.decode("utf-8")))}
+        except ValueError:
+            pass
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode_body(stored: Dict) -> bytes:
+    if "json" in stored:
+        return json.dumps(stored["json"], separators=(",", ":")).encode("utf-8")
+    if "text" in stored:
+        return stored["text"].encode("utf-8")
+    return base64.b64decode(stored.get("base64", ""))
+
+
+class Cassette:
+    """One recorded run. Use Cassette.record(path) or Cassette.replay(path, speed), then http_client.set_cassette()."""
+
+    def __init__(self, path: str, mode: str, speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.interactions: List[Dict] = []
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        # match key -> indexes of unused recordings, in recorded order
+        self._index: Dict[Tuple, Deque[int]] = defaultdict(deque)
+        self._used: set = set()
+        self.stats = {"recorded": 0, "replayed": 0, "fallbacks": 0, "misses": 0, "delay_seconds": 0.0}
+
+    @classmethod
+    def record(cls, path: str) -> "Cassette":
+        return cls(path, "record")
+
+    @classmethod
+    def replay(cls, path: str, speed: float = 1.0) -> "Cassette":
+        cassette = cls(path, "replay", speed)
+        cassette.load()
+        return cassette
+
+    # --- file -------------------------------------------------------------
+
+    def load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version {header.get('version')} in {self.path}")
+            self.interactions = [json.loads(line) for line in f if line.strip()]
+        for position, interaction in enumerate(self.interactions):
+            for key in self._keys(interaction["method"], interaction["url"], interaction["query"],
+                                  interaction["body"]):
+                self._index[key].append(position)
+        logger.info(f"Loaded {len(self.interactions)} recorded requests from {self.path}")
+
+    def save(self) -> bool:
+        try:
+            with self._lock:
+                interactions = sorted(self.interactions, key=lambda i: i["offset"])
+            with gzip.open(self.path, "wt", encoding="utf-8") as f:
+                f.write(json.dumps({"version": CASSETTE_VERSION, "recorded_at": time.time(),
+                                    "requests": len(interactions)}) + "\n")
+                for interaction in interactions:
+                    f.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+            logger.info(f"Saved {len(interactions)} requests to cassette {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write cassette {self.path}: {str(e)}")
+            return False
+
+    # --- matching ---------------------------------------------------------
+
+    @staticmethod
+    def _keys(method: str, url: str, query: str, body: str) -> List[Tuple]:
+        """Match keys from most to least specific."""
+        path = urlsplit(url).path
+        return [("exact", method, url, query, body), ("query", method, url, query), ("path", method, path)]
+
+    def _take(self, keys: List[Tuple]) -> Optional[Dict]:
+        # Caller holds the lock
+        for level, key in enumerate(keys):
+            queue = self._index.get(key)
+            while queue:
+                position = queue.popleft()
+                if position in self._used:
+                    continue
+                self._used.add(position)
+                if level:
+                    self.stats["fallbacks"] += 1
+                return self.interactions[position]
+        return None
+
+    # --- sending ----------------------------------------------------------
+
+    def send(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        """Answer from the cassette (replay) or send for real and keep a copy (record)."""
+        method = method.upper()
+        base, query, _ = _normalize(url, kwargs.get("params"))
+        body = _body_digest(kwargs)
+        if self.mode == "replay":
+            return self._replay(method, base, query, body)
+
+        start = time.monotonic()
+        response = session.request(method, url, **kwargs)
+        content = response.content
+        elapsed = time.monotonic() - start
+        interaction = {
+            "offset": round(start - self._started, 4),
+            "elapsed": round(elapsed, 4),
+            "method": method,
+            "url": base,
+            "query": query,
+            "body": body,
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in KEPT_RESPONSE_HEADERS if h in response.headers},
+            "response": _encode_body(content, response.headers.get("Content-Type", "")),
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+            self.stats["recorded"] += 1
+        return response
+
+    def _replay(self, method: str, base: str, query: str, body: str) -> requests.Response:
+        import http_client
+        with self._lock:
+            interaction = self._take(self._keys(method, base, query, body))
+            if interaction is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["replayed"] += 1
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response for {method} {base}?{query}")
+        if self.speed > 0:
+            delay = interaction["elapsed"] / self.speed
+            time.sleep(delay)
+            with self._lock:
+                self.stats["delay_seconds"] += delay
+        url = f"{base}?{query}" if query else base
+        return http_client.build_response(url, interaction["status"], _decode_body(interaction["response"]),
+                                          interaction.get("headers"), method)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "interactions": len(self.interactions),
+                    "unused": len(self.interactions) - len(self._used) if self.mode == "replay" else 0}
+
+    def summary_line(self) -> str:
+        s = self.summary()
+        if self.mode == "record":
+            return f"HTTP cassette: recorded {s['recorded']} requests to {self.path}"
+        return (f"HTTP cassette: replayed {s['replayed']} of {s['interactions']} requests from {self.path} "
+                f"({s['fallbacks']} loose matches, {s['misses']} misses, {s['unused']} unused, "
+                f"{s['delay_seconds']:.1f}s simulated latency at {self.speed:g}x)")
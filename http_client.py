@@ -0,0 +1,294 @@
+# http_client.py
+"""
+Shared outbound HTTP path for Samanage, Okta and Slack calls.
+
+Every request goes through one pooled requests.Session and an adaptive
+(AIMD) concurrency limiter for its host: the limit creeps up by one while
+latency stays flat and is cut multiplicatively on 429/5xx, network errors
+or latency spikes. Thread pools can therefore be sized generously; the
+limiter decides how many requests are actually in flight.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# (initial, minimum, maximum) concurrent requests per host
+DEFAULT_LIMITS: Tuple[int, int, int] = (8, 1, 32)
+HOST_LIMITS: Dict[str, Tuple[int, int, int]] = {
+    "api.samanage.com": (10, 2, 30),
+    "okta.com": (6, 1, 16),
+    "slack.com": (2, 1, 4),
+}
+
+# Cut the limit when recent latency is this many times the baseline
+LATENCY_SPIKE_FACTOR = 2.0
+# Multiplicative decrease on 429/5xx/errors and on latency spikes
+ERROR_BACKOFF = 0.5
+LATENCY_BACKOFF = 0.75
+# Don't cut again within this many seconds of the last cut (one burst = one cut)
+DECREASE_COOLDOWN = 1.0
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on concurrent requests, with queue-depth and limit instrumentation."""
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.in_flight = 0
+        self.queued = 0
+        self.increases = 0
+        self.decreases = 0
+        self.completed = 0
+        self._successes = 0
+        self._baseline: Optional[float] = None   # slow EWMA of latency
+        self._recent: Optional[float] = None     # fast EWMA of latency
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            self.queued += 1
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.queued -= 1
+            self.in_flight += 1
+
+    def release(self, latency: float, status: Optional[int] = None, error: bool = False) -> None:
+        """Return a slot and adjust the limit from the request's outcome."""
+        with self._cond:
+            self.in_flight -= 1
+            self.completed += 1
+            if error or status == 429 or (status is not None and status >= 500):
+                self._decrease(ERROR_BACKOFF, f"status {status}" if status else "network error")
+            else:
+                self._recent = latency if self._recent is None else 0.3 * latency + 0.7 * self._recent
+                self._baseline = latency if self._baseline is None else 0.05 * latency + 0.95 * self._baseline
+                if self._recent > self._baseline * LATENCY_SPIKE_FACTOR and self.completed > self.limit:
+                    self._decrease(LATENCY_BACKOFF, f"latency {self._recent:.2f}s vs {self._baseline:.2f}s")
+                else:
+                    # Additive increase: +1 after a full window of healthy responses
+                    self._successes += 1
+                    if self._successes >= self.limit and self.limit < self.max_limit:
+                        self.limit += 1
+                        self.increases += 1
+                        self._successes = 0
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        now = time.monotonic()
+        self._successes = 0
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        new_limit = max(self.min_limit, int(self.limit * factor))
+        if new_limit < self.limit:
+            logger.debug(f"{self.name}: concurrency {self.limit} -> {new_limit} ({reason})")
+            self.limit = new_limit
+            self.decreases += 1
+        self._last_decrease = now
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "host": self.name,
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "completed": self.completed,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(l[2] for l in HOST_LIMITS.values()) + DEFAULT_LIMITS[2])
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# Conditional-GET response cache, created on first cached request.
+# Set OKTA_HTTP_CACHE=0 to turn it off.
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+# When set, non-GET requests are handed to this callable instead of the network
+# (see shadow_mode.py). Called as interceptor(method, url, **kwargs) -> Response.
+_write_interceptor: Optional[Callable[..., requests.Response]] = None
+
+
+# When set, requests that would reach the network are recorded to or replayed from
+# this http_cassette.Cassette instead (see http_cassette.py)
+_cassette = None
+
+
+def set_cassette(cassette) -> None:
+    """Record or replay every network request through *cassette*; None restores plain requests.
+
+    The conditional-GET cache is bypassed while a cassette is set, so a
+    recording holds full bodies and a replay doesn't depend on local cache state.
+    """
+    global _cassette
+    _cassette = cassette
+
+
+# Stands in for API tokens during replay, so an offline machine never asks 1Password
+REPLAY_TOKEN = "replay"
+
+
+def replaying() -> bool:
+    """True when responses come from a cassette, so credentials are not needed."""
+    return _cassette is not None and _cassette.mode == "replay"
+
+
+def set_write_interceptor(interceptor: Optional[Callable[..., requests.Response]]) -> None:
+    """Route writes (POST/PUT/PATCH/DELETE) to *interceptor*; None restores real writes."""
+    global _write_interceptor
+    _write_interceptor = interceptor
+
+
+def build_response(url: str, status_code: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+                   method: str = "GET") -> requests.Response:
+    """Build a requests.Response that did not come off the network (stubs, cache hits)."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response._content_consumed = True
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.url = url
+    response.encoding = "utf-8"
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+def limiter_for(url: str) -> AdaptiveConcurrencyLimiter:
+    """Return the shared limiter for the URL's host."""
+    host = urlparse(url).hostname or ""
+    # Okta orgs and other subdomains share their parent's settings
+    key = next((h for h in HOST_LIMITS if host == h or host.endswith("." + h)), host)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            initial, min_limit, max_limit = HOST_LIMITS.get(key, DEFAULT_LIMITS)
+            limiter = AdaptiveConcurrencyLimiter(key, initial, min_limit, max_limit)
+            _limiters[key] = limiter
+        return limiter
+
+
+def response_cache():
+    """The shared HttpCache, or None if caching is turned off."""
+    global _response_cache
+    if os.getenv("OKTA_HTTP_CACHE", "1") == "0" or _cassette is not None:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            from http_cache import HttpCache
+            _response_cache = HttpCache()
+        return _response_cache
+
+
+def request(method: str, url: str, cache: bool = False, **kwargs) -> requests.Response:
+    """Send a request through the shared session and the host's concurrency limiter.
+
+    With *cache* (GET only), the request is made conditional on the stored
+    ETag/Last-Modified and a 304 is answered from the on-disk cache as a 200.
+    """
+    store = response_cache() if cache and method.upper() == "GET" else None
+    entry = None
+    if store is not None:
+        # The body has to be read in full to be stored
+        kwargs.pop("stream", None)
+        key = store.key(url, kwargs.get("params"), kwargs.get("headers"))
+        entry = store.lookup(key)
+        if entry:
+            plain_kwargs = dict(kwargs)
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **store.validators(entry)}
+
+    response = _send(method, url, **kwargs)
+
+    if store is not None:
+        if response.status_code == 304 and entry:
+            body = store.read(key)
+            if body is not None:
+                return build_response(response.url, 200, body, entry.get("headers"), method)
+            # Body evicted or deleted since the lookup: a bare 304 has nothing to decode, so ask again
+            logger.info(f"Cached body for {url} is gone; re-fetching without validators")
+            response = _send(method, url, **plain_kwargs)
+        if response.status_code == 200:
+            store.store(key, response.url, response.content, response.headers)
+    return response
+
+
+def _send(method: str, url: str, **kwargs) -> requests.Response:
+    """One request through the host's concurrency limiter (and the write interceptor / cassette)."""
+    limiter = limiter_for(url)
+    limiter.acquire()
+    start = time.monotonic()
+    response = None
+    try:
+        if _write_interceptor is not None and method.upper() != "GET":
+            response = _write_interceptor(method.upper(), url, **kwargs)
+        elif _cassette is not None:
+            response = _cassette.send(_session, method, url, **kwargs)
+        else:
+            response = _session.request(method, url, **kwargs)
+        return response
+    finally:
+        # Any exception (not just network errors) must give the slot back, or the host stalls
+        if response is None:
+            limiter.release(time.monotonic() - start, error=True)
+        else:
+            limiter.release(time.monotonic() - start, response.status_code)
+
+
+def get(url: str, cache: bool = False, **kwargs) -> requests.Response:
+    return request("GET", url, cache=cache, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def max_concurrency(url: str) -> int:
+    """Upper bound on concurrent requests to the URL's host (for sizing thread pools)."""
+    return limiter_for(url).max_limit
+
+
+def stats() -> List[Dict]:
+    """Current limit, in-flight and queued counts for every host seen so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
+
+
+def log_stats(log: logging.Logger = logger) -> None:
+    for s in stats():
+        log.info(f"HTTP {s['host']}: limit {s['limit']}, {s['completed']} requests, "
+                 f"{s['increases']} increases, {s['decreases']} decreases, queued now {s['queued']}")
+    if _response_cache is not None:
+        _response_cache.flush()
+        c = _response_cache.summary()
+        lookups = c["hits"] + c["misses"]
+        hit_rate = f"{100.0 * c['hits'] / lookups:.0f}%" if lookups else "n/a"
+        log.info(f"HTTP cache: {c['hits']} hits / {lookups} cacheable requests ({hit_rate}), "
+                 f"{c['bytes_saved'] / 1024:.0f} KB not downloaded, {c['entries']} entries "
+                 f"({c['bytes'] / 1024 / 1024:.1f} MB), {c['evicted']} evicted")
+    if _cassette is not None:
+        log.info(_cassette.summary_line())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Streaming Incident Decoder
+Decodes a Samanage /incidents.json page one incident at a time straight off
+the response stream and keeps only the fields parse_ticket needs. The
+full page (descriptions, requester, comment metadata, ...) is never held in
+memory at once.
+"""
+
+import codecs
+import json
+from typing import Dict, Iterable, Iterator, Optional
+
+# Top-level incident fields the pipeline reads
+INCIDENT_FIELDS = ("id", "number", "state", "created_at", "updated_at", "name")
+# custom_fields_values entries parse_ticket reads; names starting with a prefix also match
+CUSTOM_FIELD_NAMES = {
+    "New Employee Name", "New Employee Title", "New Employee Department",
+    "streetAddress", "city", "state", "zipCode", "countryCode", "Reports to",
+    "Start Date", "New Employee Start Date",
+    "Personal Email", "New Employee Personal Email", "New Employee Email",
+}
+CUSTOM_FIELD_PREFIXES = ("state - Formatted", "countryCode - Formatted")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def _wanted_field(name) -> bool:
+    return isinstance(name, str) and (name in CUSTOM_FIELD_NAMES or name.startswith(CUSTOM_FIELD_PREFIXES))
+
+
+def project_incident(incident: Dict) -> Dict:
+    """Copy only the fields parse_ticket and the scheduler use out of a full incident."""
+    out = {key: incident[key] for key in INCIDENT_FIELDS if key in incident}
+    catalog_item = incident.get("catalog_item")
+    if isinstance(catalog_item, dict) and "id" in catalog_item:
+        out["catalog_item"] = {"id": catalog_item["id"]}
+    fields = []
+    for field in incident.get("custom_fields_values") or []:
+        if not isinstance(field, dict) or not _wanted_field(field.get("name")):
+            continue
+        kept = {"name": field["name"], "value": field.get("value")}
+        user = field.get("user")
+        if isinstance(user, dict) and "email" in user:
+            kept["user"] = {"email": user["email"]}
+        fields.append(kept)
+    out["custom_fields_values"] = fields
+    return out
+
+
+def iter_json_array(chunks: Iterable[bytes], counter: Optional[Dict[str, int]] = None) -> Iterator[object]:
+    """Yield each element of a top-level JSON array as soon as it is complete.
+
+    Memory is bounded by the largest single element rather than the whole
+    document. If *counter* is given, counter["bytes"] tracks bytes read.
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    started = False
+    exhausted = False
+
+    def more() -> bool:
+        nonlocal buf, pos, exhausted
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if counter is not None:
+                counter["bytes"] = counter.get("bytes", 0) + len(chunk)
+            # Drop what has already been decoded before growing the buffer
+            buf = buf[pos:] + text.decode(chunk)
+            pos = 0
+            return True
+        buf = buf[pos:] + text.decode(b"", final=True)
+        pos = 0
+        exhausted = True
+        return False
+
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buf):
+            if exhausted or not more():
+                if not started:
+                    raise ValueError("Empty response where a JSON array was expected")
+                raise ValueError("Truncated JSON array")
+            continue
+
+        char = buf[pos]
+        if not started:
+            if char != "[":
+                raise ValueError(f"Expected a JSON array, got {char!r}")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Element continues in the next chunk
+            if exhausted or not more():
+                raise
+            continue
+        if not exhausted and not isinstance(item, (dict, list, str)):
+            # A number or literal is only complete once its delimiter has arrived: "12." or
+            # "1.5e" at the end of a chunk decodes early as 12 / 1.5 and leaves the rest behind
+            rest = buf[end:].lstrip(_WHITESPACE)
+            if not rest or rest[0] not in ",]":
+                more()
+                continue
+        pos = end
+        yield item
+
+
+def iter_incidents(chunks: Iterable[bytes], counter: Optional[Dict[str, int]] = None) -> Iterator[Dict]:
+    """Stream projected incidents from raw page bytes."""
+    for incident in iter_json_array(chunks, counter):
+        if isinstance(incident, dict):
+            yield project_incident(incident)
@@ -0,0 +1,197 @@
+# log_config.py
+"""
+Logging setup for the Okta automation.
+
+Worker threads only put records on an in-memory queue; a single listener
+thread owns the file and console handlers, so log I/O never runs on the
+request path. console() messages go through the same queue and are printed
+by the listener thread, which also flushes the log file on a timer.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), 'logs')
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Per-module level overrides, e.g. {"ticket_extractor": logging.DEBUG}.
+# Can also be set with OKTA_LOG_LEVELS="ticket_extractor=DEBUG,okta_groups=WARNING"
+DEFAULT_MODULE_LEVELS = {
+    "urllib3": logging.WARNING,
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_console_handler: Optional[logging.Handler] = None
+_log_queue: Optional[queue.SimpleQueue] = None
+_quiet = False
+
+
+class BatchingFileHandler(logging.FileHandler):
+    """FileHandler that flushes every *flush_every* records or *flush_interval* seconds."""
+
+    def __init__(self, filename: str, flush_every: int = 50, flush_interval: float = 1.0, encoding: str = 'utf-8'):
+        super().__init__(filename, encoding=encoding)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self._pending += 1
+            if (self._pending >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def flush_if_due(self):
+        """Flush buffered records older than *flush_interval* (called when no record arrives)."""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.acquire()
+            try:
+                self.flush()
+            finally:
+                self.release()
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes batching handlers every *flush_interval* seconds while the queue is idle."""
+
+    def __init__(self, log_queue, *handlers, flush_interval: float = 1.0, respect_handler_level: bool = False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    if isinstance(handler, BatchingFileHandler):
+                        handler.flush_if_due()
+
+
+def _is_console_message(record) -> bool:
+    return getattr(record, "console_message", False)
+
+
+def _parse_module_levels(spec: str) -> Dict[str, int]:
+    """Parse "module=LEVEL,module=LEVEL" into a level mapping."""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        level_value = logging.getLevelName(level.strip().upper())
+        if isinstance(level_value, int):
+            levels[name.strip()] = level_value
+    return levels
+
+
+def is_quiet() -> bool:
+    """Return True when console output is turned off."""
+    return _quiet
+
+
+def console(message: str = "") -> None:
+    """Print a console message unless quiet mode is on.
+
+    Once logging is set up the message is queued and printed by the listener
+    thread, so callers on the provisioning path never wait on the terminal.
+    """
+    if _quiet:
+        return
+    if _log_queue is None:
+        print(message)
+        return
+    _log_queue.put_nowait(logging.makeLogRecord({
+        "msg": str(message), "levelno": logging.INFO, "levelname": "INFO", "console_message": True,
+    }))
+
+
+def setup_logging(level: int = logging.INFO, quiet: Optional[bool] = None,
+                  module_levels: Optional[Dict[str, int]] = None) -> logging.Logger:
+    """Set up queued logging to both file and console.
+
+    Safe to call more than once; the listener thread is only started the
+    first time. *quiet* turns off the console handler and console() prints
+    (defaults to the OKTA_QUIET environment variable).
+    """
+    global _listener, _console_handler, _log_queue, _quiet
+
+    if quiet is None:
+        quiet = os.environ.get("OKTA_QUIET", "").lower() in ("1", "true", "yes")
+    _quiet = quiet
+
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    levels.update(_parse_module_levels(os.environ.get("OKTA_LOG_LEVELS", "")))
+    levels.update(module_levels or {})
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    if _listener is None:
+        # Create logs directory if it doesn't exist
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_file = os.path.join(LOG_DIR, f"okta_automation_{datetime.now().strftime('%Y-%m-%d')}.log")
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        file_handler = BatchingFileHandler(log_file)
+        _console_handler = logging.StreamHandler()
+        handlers = [file_handler, _console_handler]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            handler.addFilter(lambda record: not _is_console_message(record))
+        # console() messages: printed as-is to stdout, never written to the log file
+        print_handler = logging.StreamHandler(sys.stdout)
+        print_handler.setFormatter(logging.Formatter('%(message)s'))
+        print_handler.addFilter(_is_console_message)
+        handlers.append(print_handler)
+
+        _log_queue = queue.SimpleQueue()
+        root.handlers = [logging.handlers.QueueHandler(_log_queue)]
+        _listener = FlushingQueueListener(_log_queue, *handlers, flush_interval=file_handler.flush_interval,
+                                          respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+    # Quiet mode keeps the file log but drops everything on the console
+    _console_handler.setLevel(logging.CRITICAL + 1 if quiet else logging.NOTSET)
+
+    return root
+
+
+def stop_logging() -> None:
+    """Drain the log queue and flush all handlers."""
+    global _listener, _console_handler, _log_queue
+    if _listener is None:
+        return
+    # console() prints directly again from here on
+    _log_queue = None
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+        handler.close()
+    logging.getLogger().handlers = []
+    _listener = None
+    _console_handler = None
@@ -9,7 +9,6 @@ import re
 from datetime import datetime, timedelta
 from collections import defaultdict
 import glob
-from slack_integration import send_report_to_slack
 
 def parse_log_file(log_file_path):
     """Parse a single log file and extract key metrics."""
@@ -120,6 +119,7 @@ def send_daily_report_to_slack(date_str=None):
             return False
         
         report_date = date_str or datetime.now().strftime('%Y-%m-%d')
+        from slack_integration import send_report_to_slack
         success = send_report_to_slack(
             report_title=f"Daily Report - {report_date}",
             report_content=report,
@@ -138,6 +138,7 @@ def send_weekly_report_to_slack():
             print("No logs directory found, skipping Slack report")
             return False
         
+        from slack_integration import send_report_to_slack
         success = send_report_to_slack(
             report_title="Weekly Report",
             report_content=report,
@@ -162,6 +163,7 @@ def send_monthly_report_to_slack(year=None, month=None):
             month = now.month
         
         month_name = datetime(year, month, 1).strftime('%B %Y')
+        from slack_integration import send_report_to_slack
         success = send_report_to_slack(
             report_title=f"Monthly Report - {month_name}",
             report_content=report,
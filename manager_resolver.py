@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Manager Resolution
+Maps "Reports to" manager emails to Okta user IDs for the managerId field,
+with one batched search per run and a TTL cache on disk.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from config import OKTA_ORG_URL
+from cache_store import load_json, save_json
+from okta_api import iter_pages
+
+logger = logging.getLogger(__name__)
+
+MANAGER_CACHE_FILE = "okta_manager_ids.json"
+MANAGER_CACHE_TTL_HOURS = 24
+# Emails per search query; keeps the query string well under URL limits
+SEARCH_BATCH_SIZE = 20
+
+
+class ManagerResolver:
+    """Email -> Okta user ID cache filled by batched /api/v1/users searches.
+
+    Misses are cached too, so a manager who isn't in Okta is only searched
+    for once per TTL.
+    """
+
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None, ttl_hours: float = MANAGER_CACHE_TTL_HOURS,
+                 cache_file: str = MANAGER_CACHE_FILE):
+        self.entries: Dict[str, Dict] = entries or {}
+        self.ttl_seconds = ttl_hours * 3600
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    @classmethod
+    def load(cls, ttl_hours: float = MANAGER_CACHE_TTL_HOURS, cache_file: str = MANAGER_CACHE_FILE) -> "ManagerResolver":
+        return cls(load_json(cache_file, default={}) or {}, ttl_hours, cache_file)
+
+    def save(self) -> bool:
+        with self._lock:
+            return save_json(self.cache_file, self.entries)
+
+    def _fresh(self, email: str) -> bool:
+        entry = self.entries.get(email)
+        return bool(entry) and time.time() - entry.get("resolved_at", 0) < self.ttl_seconds
+
+    def _store(self, email: str, user_id: Optional[str]) -> None:
+        with self._lock:
+            self.entries[email] = {"id": user_id, "resolved_at": time.time()}
+
+    def prime(self, emails: Iterable[str], headers: Dict[str, str], directory=None) -> int:
+        """Resolve every distinct email not already cached. Returns the number of searches made.
+
+        Logins in *directory* (an OktaUserDirectory) are used first; manager
+        logins are normally their email, so most managers need no API call.
+        """
+        pending = []
+        for email in {e.strip().lower() for e in emails if e and e.strip()}:
+            if self._fresh(email):
+                continue
+            known = directory.users.get(email) if directory is not None else None
+            if known and known.get("id"):
+                self._store(email, known["id"])
+            elif '"' not in email:
+                pending.append(email)
+
+        searches = 0
+        url = f"{OKTA_ORG_URL}/api/v1/users"
+        for start in range(0, len(pending), SEARCH_BATCH_SIZE):
+            batch = pending[start:start + SEARCH_BATCH_SIZE]
+            query = " or ".join(f'profile.email eq "{email}"' for email in batch)
+            found = {}
+            try:
+                for page in iter_pages(url, headers, {"search": query, "limit": 200}):
+                    for user in page:
+                        email = (user.get("profile", {}).get("email") or "").lower()
+                        if email:
+                            found[email] = user.get("id")
+                searches += 1
+            except Exception as e:
+                logger.warning(f"Manager lookup failed for {len(batch)} emails: {str(e)}")
+                continue
+            for email in batch:
+                self._store(email, found.get(email))
+
+        self.lookups += searches
+        if pending:
+            logger.info(f"Resolved {len(pending)} manager emails with {searches} Okta searches")
+        return searches
+
+    def resolve(self, email: Optional[str]) -> Optional[str]:
+        """Return the cached Okta user ID for a manager email, if known."""
+        if not email:
+            return None
+        entry = self.entries.get(email.strip().lower())
+        return entry.get("id") if entry else None
+
+    def apply(self, users: Iterable[Dict]) -> int:
+        """Fill in managerId on each user from their manager_email. Returns how many were set."""
+        filled = 0
+        for user in users:
+            manager_id = self.resolve(user.get("manager_email"))
+            if manager_id and not user.get("managerId"):
+                user["managerId"] = manager_id
+                filled += 1
+        return filled
@@ -0,0 +1,227 @@
+# notification_dispatcher.py
+"""
+Background dispatcher for post-creation work (ticket updates, Slack).
+
+The provisioning path only submits a job and moves on to the next user.
+Worker threads run the jobs. If the queue is full, or jobs are still pending
+when the shutdown deadline expires, they are written to a spill file, and
+the next run replays that file first.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from cache_store import cache_path
+
+logger = logging.getLogger(__name__)
+
+SPILL_NAME = 'notification_spill.jsonl'
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 200
+DEFAULT_MAX_ATTEMPTS = 2
+
+
+class NotificationDispatcher:
+    """Bounded job queue drained by worker threads.
+
+    Jobs are plain (kind, payload) pairs so they can be written to the spill
+    file. Register one handler per kind before starting the dispatcher.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 spill_path: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.workers = workers
+        # Resolved per instance so a run redirected to another cache folder spills there
+        self.spill_path = spill_path or cache_path(SPILL_NAME)
+        self.max_attempts = max_attempts
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self._handlers: Dict[str, Callable] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "spilled": 0, "replayed": 0}
+
+    def register(self, kind: str, handler: Callable) -> None:
+        """Register the callable that runs jobs of *kind* (called with the job payload as kwargs)."""
+        self._handlers[kind] = handler
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def start(self) -> None:
+        """Replay spilled jobs from a previous run and start the workers."""
+        for job in self._load_spill():
+            self._enqueue(job)
+            self._count("replayed")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"notify-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, **payload) -> bool:
+        """Queue a job without blocking. Returns False if it had to be spilled to disk."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        self._count("submitted")
+        return self._enqueue({"kind": kind, "payload": payload, "attempts": 0})
+
+    def _enqueue(self, job: Dict) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            logger.warning(f"Notification queue full, spilling {job['kind']} job to disk")
+            self._spill([job])
+            return False
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                job = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Dict) -> None:
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            logger.error(f"Dropping job with unknown kind: {job['kind']}")
+            self._count("failed")
+            return
+        job["attempts"] += 1
+        try:
+            handler(**job["payload"])
+            self._count("completed")
+        except Exception as e:
+            if job["attempts"] < self.max_attempts and not self._stop.is_set():
+                logger.warning(f"{job['kind']} job failed (attempt {job['attempts']}), retrying: {str(e)}")
+                self._enqueue(job)
+            else:
+                logger.error(f"{job['kind']} job failed after {job['attempts']} attempts: {str(e)}")
+                self._count("failed")
+
+    def wait_idle(self, timeout: float = 30.0) -> bool:
+        """Wait up to *timeout* seconds for every queued job (and its retries) to finish.
+
+        The workers keep running. Returns False if jobs were still pending.
+        """
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < end:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def shutdown(self, deadline: float = 30.0) -> Dict[str, int]:
+        """Wait up to *deadline* seconds for queued jobs, spill the rest, and stop the workers."""
+        end = time.monotonic() + deadline
+        self.wait_idle(deadline)
+
+        self._stop.set()
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if leftover:
+            logger.warning(f"Shutdown deadline reached, spilling {len(leftover)} pending notification jobs")
+            self._spill(leftover)
+
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, end - time.monotonic()) + 1.0)
+        self._threads = []
+        return dict(self.stats)
+
+    def _append(self, lines: List[str]) -> None:
+        # Caller holds _spill_lock
+        os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line.rstrip("\n") + "\n")
+
+    def _spill(self, jobs: List[Dict]) -> None:
+        with self._spill_lock:
+            try:
+                self._append([json.dumps(job) for job in jobs])
+                self._count("spilled", len(jobs))
+            except Exception as e:
+                logger.error(f"Failed to spill {len(jobs)} notification jobs: {str(e)}")
+
+    def _restore(self, claimed: str) -> None:
+        """Put a claimed spill file back so the next run replays it."""
+        # Caller holds _spill_lock
+        try:
+            if not os.path.exists(self.spill_path):
+                os.replace(claimed, self.spill_path)
+                return
+            with open(claimed, 'r', encoding='utf-8') as f:
+                self._append([line for line in f if line.strip()])
+            os.remove(claimed)
+        except Exception as e:
+            logger.error(f"Could not put notification spill file back; jobs left in {claimed}: {str(e)}")
+
+    def _load_spill(self) -> List[Dict]:
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return []
+            # Claim the file by renaming it first: a second process starting at the
+            # same time finds nothing to replay, and jobs another run spills from
+            # now on go to a fresh file instead of being deleted unread
+            claimed = f"{self.spill_path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.replaying"
+            try:
+                os.replace(self.spill_path, claimed)
+            except FileNotFoundError:
+                return []
+            except OSError as e:
+                # e.g. still open for appending by another process on Windows; try next run
+                logger.warning(f"Notification spill file is busy, replaying it next run: {str(e)}")
+                return []
+            try:
+                with open(claimed, 'r', encoding='utf-8') as f:
+                    lines = [line for line in f if line.strip()]
+            except Exception as e:
+                logger.error(f"Failed to read notification spill file, keeping it for the next run: {str(e)}")
+                self._restore(claimed)
+                return []
+
+            jobs, kept, kinds = [], [], set()
+            for line in lines:
+                try:
+                    job = json.loads(line)
+                except ValueError:
+                    logger.error(f"Dropping corrupt line in notification spill file: {line[:120]!r}")
+                    continue
+                if job.get("kind") in self._handlers:
+                    jobs.append(job)
+                else:
+                    kept.append(line)
+                    kinds.add(str(job.get("kind")))
+            if kept:
+                # Another entry point may own these; leave them for a run that registers the kind
+                logger.warning(f"Keeping {len(kept)} spilled jobs with no handler here ({', '.join(sorted(kinds))})")
+                try:
+                    self._append(kept)
+                except Exception as e:
+                    logger.error(f"Failed to keep unhandled spilled jobs, keeping the whole file: {str(e)}")
+                    self._restore(claimed)
+                    return []
+            try:
+                os.remove(claimed)
+            except OSError as e:
+                logger.warning(f"Could not remove replayed spill file {claimed}: {str(e)}")
+            if jobs:
+                logger.info(f"Replaying {len(jobs)} spilled notification jobs")
+            return jobs
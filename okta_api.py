@@ -0,0 +1,53 @@
+# okta_api.py
+"""
+Shared helpers for paginated Okta list endpoints.
+"""
+
+import http_client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+
+def next_link(response) -> Optional[str]:
+    """Return the rel="next" URL from an Okta Link header, if any."""
+    link_header = response.headers.get('link', '')
+    if 'rel="next"' not in link_header:
+        return None
+    for link in link_header.split(','):
+        if 'rel="next"' in link:
+            return link.split('<')[1].split('>')[0]
+    return None
+
+
+def _get_page(url: str, headers: Dict[str, str], params: Optional[Dict], timeout: int, cache: bool = False):
+    response = http_client.get(url, headers=headers, params=params, timeout=timeout, cache=cache)
+    response.raise_for_status()
+    return response
+
+
+def iter_pages(url: str, headers: Dict[str, str], params: Optional[Dict] = None,
+               timeout: int = 30, prefetch: bool = True, cache: bool = False) -> Iterator[List[Dict]]:
+    """Yield each page of an Okta list endpoint, following Link: rel="next".
+
+    With *prefetch*, the request for the next page is sent as soon as its
+    cursor is known, so it overlaps with decoding and processing the
+    current page. With *cache*, pages are conditional GETs (see http_cache.py).
+    """
+    if not prefetch:
+        next_url = url
+        while next_url:
+            response = _get_page(next_url, headers, params, timeout, cache)
+            yield response.json()
+            next_url = next_link(response)
+            # The next link already carries the query string
+            params = None
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(_get_page, url, headers, params, timeout, cache)
+        while future is not None:
+            response = future.result()
+            next_url = next_link(response)
+            # The next link already carries the query string
+            future = executor.submit(_get_page, next_url, headers, None, timeout, cache) if next_url else None
+            yield response.json()
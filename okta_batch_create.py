@@ -3,102 +3,122 @@
 import json
 import requests
 import logging
+import http_client
 import os
+import shutil
+import sys
+import time
 from datetime import datetime
 from config import OKTA_ORG_URL, get_okta_token
-from ticket_extractor import fetch_tickets, filter_onboarding_users
+from ticket_extractor import fetch_tickets, filter_onboarding_users, fetch_stats, ACTIVE_STATES
 from solarwinds_integration import update_ticket_status_direct, add_ticket_comment_direct
-from slack_integration import send_slack_notification
+from slack_integration import send_slack_notification, SlackNotificationAggregator
 from okta_groups import assign_user_to_groups, validate_group_mappings
+from log_config import setup_logging, console
+from notification_dispatcher import NotificationDispatcher
+from okta_user_directory import OktaUserDirectory
+from email_allocator import EmailAllocator
+from department_resolver import get_resolver
+from batch_validation import validate_batch, DUPLICATE_ISSUE, UNKNOWN_DEPARTMENT_ISSUE
+from manager_resolver import ManagerResolver
+from shadow_mode import ShadowRecorder
+from onboarding_user import OnboardingUser
+from parse_cache import ParseCache
+from provisioning_scheduler import ProvisioningScheduler, priority_key, PROVISION_WORKERS
+from cache_store import cache_path, load_json, save_json, use_scratch_copy
+from run_lease import RunLease, LeaseLost
+from work_queue import shared_queue_backend
+from http_cassette import Cassette
 
-# Configure logging
-def setup_logging():
-    """Set up logging to both file and console."""
-    # Create logs directory if it doesn't exist
-    log_dir = os.path.join(os.path.dirname(__file__), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Create log file with date
-    log_file = os.path.join(log_dir, f"okta_automation_{datetime.now().strftime('%Y-%m-%d')}.log")
-    
-    # Configure logging format
-    log_format = '%(asctime)s - %(levelname)s - %(message)s'
-    
-    # Set up logging to both file and console
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
-    
-    return logging.getLogger(__name__)
+setup_logging()
+logger = logging.getLogger(__name__)
 
-logger = setup_logging()
+# How long main() waits for background ticket updates / Slack posts on shutdown
+NOTIFICATION_DRAIN_SECONDS = 60
+SHADOW_SPILL_NAME = 'notification_spill.shadow.jsonl'
+# Stop starting new users this long after a run begins, so scheduled runs never overlap
+# (override with OKTA_RUN_BUDGET_MINUTES or --budget-minutes; 0 means no limit)
+RUN_BUDGET_MINUTES = float(os.getenv("OKTA_RUN_BUDGET_MINUTES", "90"))
+CARRYOVER_FILE = "carryover.json"
+# A --helper run waits this long for the active run to publish its batch, checking every few seconds
+HELPER_WAIT_SECONDS = 600
+HELPER_POLL_SECONDS = 5
 
 
 def build_okta_payload(user):
-    """Construct an Okta‑compliant payload and return it with the work email."""
-    parts = user["name"].strip().split()
-    first_name = parts[0]
-    last_name = " ".join(parts[1:]) if len(parts) > 1 else ""
-    work_email = f"{first_name.lower()}{last_name.lower()}@filevine.com"
-
-    payload = {
-        "profile": {
-            "firstName": first_name,
-            "lastName": last_name,
-            "displayName": f"{first_name} {last_name}",
-            "email": work_email,
-            "login": work_email,
-            "mobilePhone": user.get("phone", ""),
-            "secondEmail": user.get("personal_email", ""),
-            "streetAddress": user.get("streetAddress", ""),
-            "city": user.get("city", ""),
-            "state": user.get("state", "UT"),
-            "zipCode": user.get("zipCode", ""),
-            "countryCode": user.get("countryCode", "US"),
-            "department": user.get("department", ""),
-            "title": user.get("title", ""),
-            "managerId": user.get("managerId", ""),
-            # Use manager_email for Okta's 'manager' field
-            "manager": user.get("manager_email", ""),
-            "preferredLanguage": "en",
-            "timezone": user.get("timezone", "America/Denver"),  # Use timezone from address parsing
-            "organization": "Filevine",
-            "swrole": "Requester",
-            "primary": True
-        }
-    }
-    return payload, work_email
+    """Construct an Okta‑compliant payload and return it with the work email.
+
+    Uses user["work_email"] when an EmailAllocator has already picked one.
+    Plain dicts are accepted as well as OnboardingUser records.
+    """
+    return OnboardingUser.from_dict(user).to_okta_payload()
+
 
+def run_post_creation_tasks(ticket_id, ticket_number, work_email, user_name, user_title, notifier=None):
+    """Move the ticket to 'In Progress', comment on it, and send the Slack notification.
+
+    Raises if the ticket update fails so the dispatcher can retry the job.
+    If *notifier* (a SlackNotificationAggregator) is given, the Slack
+    notification is queued on it instead of being posted right away.
+    """
+    success = update_ticket_status_direct(ticket_id, ticket_number, "In Progress")
+    if not success:
+        raise RuntimeError(f"status update failed for ticket #{ticket_number}")
+    logger.info(f" Updated ticket #{ticket_number} status to 'In Progress'")
+
+    # Add a comment about the user creation
+    comment = "Okta User Account has been created."
+    add_ticket_comment_direct(ticket_id, ticket_number, comment)
+    logger.info(f" Added comment to ticket #{ticket_number}")
+
+    # Send Slack notification
+    if notifier is not None:
+        notifier.add(user_name, work_email, user_title, ticket_number, ticket_id)
+        logger.info(f" Slack notification queued for {user_name}")
+    else:
+        send_slack_notification(user_name, work_email, user_title, ticket_number, ticket_id)
+        logger.info(f" Slack notification sent for {user_name}")
+
+
+def create_okta_user(payload, headers, work_email, user_department=None, ticket_id=None, ticket_number=None,
+                     notifier=None, dispatcher=None, directory=None):
+    """POST a single user to Okta, log the result, and return "created", "duplicate" or "failed".
+
+    Post-creation tasks go to *dispatcher* (a NotificationDispatcher) when
+    given, otherwise they run inline. If *directory* (an OktaUserDirectory)
+    is given, known logins are reported as duplicates without calling Okta.
+    """
+    if directory is not None and directory.contains(work_email):
+        logger.warning(f" DUPLICATE: User {work_email} already exists (Ticket #{ticket_number}) [pre-flight]")
+        console(f" Already exists: {work_email}")
+        # Do NOT update ticket for duplicates
+        return "duplicate"
 
-def create_okta_user(payload, headers, work_email, user_department=None, ticket_id=None, ticket_number=None):
-    """POST a single user to Okta and log the result."""
     url = f"{OKTA_ORG_URL}/api/v1/users?activate=true"
     
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = http_client.post(url, headers=headers, json=payload, timeout=30)
 
         if response.status_code in (200, 201):
             logger.info(f"SUCCESS: Created Okta user {work_email} (Ticket #{ticket_number})")
-            print(f"Created: {work_email}")
+            console(f"Created: {work_email}")
             
             # Get the created user's ID from the response for group assignment
             created_user = response.json()
             user_id = created_user.get('id')
+            if directory is not None and user_id:
+                directory.add(work_email, user_id, created_user.get('status', 'ACTIVE'),
+                              payload['profile'].get('secondEmail'))
             
             # Assign user to groups based on department
             if user_id and user_department:
                 group_assignment_success = assign_user_to_groups(user_id, user_department, headers)
                 if group_assignment_success:
                     logger.info(f"Successfully assigned {work_email} to groups for department '{user_department}'")
-                    print(f"Added to {user_department} groups")
+                    console(f"Added to {user_department} groups")
                 else:
                     logger.warning(f"Group assignment failed for {work_email}, department '{user_department}'")
-                    print(f"Group assignment failed")
+                    console(f"Group assignment failed")
             elif user_department:
                 logger.warning(f" User created but no user ID returned for group assignment: {work_email}")
             else:
@@ -106,118 +126,390 @@ def create_okta_user(payload, headers, work_email, user_department=None, ticket_
             
             # ONLY update ticket and send notifications if user creation was successful
             if ticket_id and ticket_number:
-                try:
-                    success = update_ticket_status_direct(ticket_id, ticket_number, "In Progress")
-                    if success:
-                        logger.info(f" Updated ticket #{ticket_number} status to 'In Progress'")
-                        
-                        # Add a comment about the user creation
-                        comment = "Okta User Account has been created."
-                        add_ticket_comment_direct(ticket_id, ticket_number, comment)
-                        logger.info(f" Added comment to ticket #{ticket_number}")
-                        
-                        # Send Slack notification
-                        user_name = f"{payload['profile']['firstName']} {payload['profile']['lastName']}"
-                        user_title = payload['profile'].get('title', 'No Title')
-                        send_slack_notification(user_name, work_email, user_title, ticket_number, ticket_id)
-                        logger.info(f" Slack notification sent for {user_name}")
-                        
-                except Exception as e:
-                    logger.error(f" Post-creation tasks failed for {work_email} (Ticket #{ticket_number}): {str(e)}")
-                    print(f" Ticket update failed (user was created): {str(e)}")
+                user_name = f"{payload['profile']['firstName']} {payload['profile']['lastName']}"
+                user_title = payload['profile'].get('title', 'No Title')
+                job = {
+                    "ticket_id": ticket_id,
+                    "ticket_number": ticket_number,
+                    "work_email": work_email,
+                    "user_name": user_name,
+                    "user_title": user_title,
+                }
+                if dispatcher is not None:
+                    # Ticket updates and Slack run in the background so the next user isn't held up
+                    dispatcher.submit("post_creation", **job)
+                else:
+                    try:
+                        run_post_creation_tasks(notifier=notifier, **job)
+                    except Exception as e:
+                        logger.error(f" Post-creation tasks failed for {work_email} (Ticket #{ticket_number}): {str(e)}")
+                        console(f" Ticket update failed (user was created): {str(e)}")
+
+            return "created"
                     
         elif response.status_code == 400 and "E0000001" in response.text:
             # E0000001 often indicates a duplicate or validation error
             logger.warning(f" DUPLICATE: User {work_email} already exists (Ticket #{ticket_number})")
-            print(f" Already exists: {work_email}")
+            console(f" Already exists: {work_email}")
             # Do NOT update ticket for duplicates
+            return "duplicate"
         else:
             logger.error(f" FAILED: User creation failed for {work_email} - Status {response.status_code} (Ticket #{ticket_number})")
-            print(f" Failed: {work_email} — {response.status_code}")
+            console(f" Failed: {work_email} — {response.status_code}")
             
     except requests.exceptions.RequestException as e:
         logger.error(f" NETWORK ERROR: Failed to create {work_email} - {str(e)} (Ticket #{ticket_number})")
-        print(f" Network error creating {work_email}: {str(e)}")
+        console(f" Network error creating {work_email}: {str(e)}")
         # Do NOT update ticket for network errors
     except Exception as e:
         logger.error(f" UNEXPECTED ERROR: Failed to create {work_email} - {str(e)} (Ticket #{ticket_number})")
-        print(f" Unexpected error creating {work_email}: {str(e)}")
+        console(f" Unexpected error creating {work_email}: {str(e)}")
         # Do NOT update ticket for unexpected errors
 
+    return "failed"
+
+
+def prepare_batch(users, headers, directory, save_caches=True, parse_cache=None):
+    """Validate a parsed batch and fill in manager IDs for the ready users.
+
+    Returns (validation, duplicate_count, skipped_count). Problems are logged
+    here so every caller reports them the same way.
+    """
+    resolver = get_resolver()
+    # One report per unknown department up front, rather than one line per user
+    unresolved = resolver.find_unresolved(u for u in users if u.get("department"))
+    for department, ticket_numbers in sorted(unresolved.items()):
+        tickets_str = ", ".join(f"#{t}" for t in ticket_numbers)
+        logger.warning(f" UNKNOWN DEPARTMENT: '{department}' matches no group mapping (Tickets {tickets_str})")
+    if unresolved:
+        console(f"{sum(len(t) for t in unresolved.values())} users held back - unknown department (see log)")
+
+    validation = validate_batch(users, resolver, EmailAllocator.from_directory(directory), parse_cache)
+    logger.info(f"Batch validation: {validation.summary()}")
+    console(f"Validation: {validation.summary()}")
+    duplicate_count = 0
+    for user in validation.duplicates:
+        duplicate_count += 1
+        logger.warning(f" DUPLICATE: User {user.get('work_email')} already exists (Ticket #{user.get('ticket_number')}) [pre-flight]")
+    for label, entries in (("WARNING", validation.warnings), ("NEEDS ATTENTION", validation.needs_attention),
+                           ("INVALID", validation.invalid)):
+        for user, issues in entries:
+            # Duplicates and unknown departments were reported above
+            issues = [i for i in issues if i != DUPLICATE_ISSUE and not i.startswith(UNKNOWN_DEPARTMENT_ISSUE)]
+            if not issues:
+                continue
+            logger.warning(f" {label}: Ticket #{user.get('ticket_number')} ({user.get('name', 'Unknown')}): {'; '.join(issues)}")
+    skipped_count = len(validation.needs_attention) + len(validation.invalid) - duplicate_count
+
+    # Fill in managerId with one lookup per distinct manager
+    managers = ManagerResolver.load()
+    managers.prime((u.get("manager_email") for u in validation.ready), headers, directory)
+    filled = managers.apply(validation.ready)
+    if save_caches:
+        managers.save()
+    logger.info(f"Manager IDs resolved for {filled}/{len(validation.ready)} ready users")
+    return validation, duplicate_count, skipped_count
+
+
+def okta_headers():
+    return {
+        "Authorization": f"SSWS {http_client.REPLAY_TOKEN if http_client.replaying() else get_okta_token()}",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+
+def _provision_handler(headers, directory, notifier=None, dispatcher=None):
+    """Handler for ProvisioningScheduler: create one user in Okta and return the result label."""
+    def provision_one(user, position, total):
+        logger.info(f"Processing user {position}/{total}: {user['name']} — {user.get('title', 'No Title')} (Ticket #{user.get('ticket_number')})")
+
+        # Process user
+        console(f"\nProcessing: {user['name']} ({user.get('title', 'No Title')})")
+        payload, work_email = build_okta_payload(user)
+        ticket_id = user.get('ticket_id')
+        ticket_number = user.get('ticket_number')
+        user_department = user.get('department')  # Extract department for group assignment
+        return create_okta_user(payload, headers, work_email, user_department, ticket_id, ticket_number,
+                                notifier, dispatcher, directory)
+    return provision_one
+
 
-def main(test_mode: bool = True):
+def provision_users(users, headers, directory, notifier=None, dispatcher=None, workers=PROVISION_WORKERS,
+                    deadline=None, first_ticket_ids=(), queue=None, lease=None):
+    """Create each user in Okta, most urgent first. Returns (created, duplicates, errors, leftovers).
+
+    Users are ordered by start date, then ticket age, then department SLA
+    (see provisioning_scheduler.py) and handed to *workers* threads. Users
+    whose ticket ID is in *first_ticket_ids* go ahead of everyone else. No
+    user is started after *deadline* (time.monotonic()); the ones not
+    started are returned as leftovers.
+
+    With a shared *queue* (see work_queue.py), helper and worker processes
+    claim users from the same batch and the counts include their results;
+    *workers* may then be 0 to only coordinate.
+
+    With the run's *lease*, provisioning stops as soon as it is lost and
+    LeaseLost is raised; the run that took over owns the remaining users.
+    """
+    if queue is None:
+        workers = max(1, workers)
+    scheduler = ProvisioningScheduler(_provision_handler(headers, directory, notifier, dispatcher),
+                                      workers, get_resolver(), queue, lease)
+    if lease is not None:
+        lease.check()
+    for user in users:
+        scheduler.add(user, first=user.get("ticket_id") in first_ticket_ids)
+    scheduler.queue.open()
+    scheduler.run(deadline)
+    # Other workers may still be finishing their claims; any that expire meanwhile are handed out again here
+    while True:
+        if lease is not None:
+            lease.check()
+        if not scheduler.queue.wait_idle():
+            logger.warning("Some users claimed by another worker never reported back; carrying them over")
+            break
+        if not len(scheduler.queue) or not scheduler.queue.is_active():
+            break
+        # Even a coordinate-only run finishes abandoned claims itself rather than wait for a worker
+        scheduler.workers = max(1, scheduler.workers)
+        scheduler.run(deadline)
+    if lease is not None:
+        lease.check()
+    results = scheduler.queue.results()
+    return results["created"], results["duplicate"], results["failed"], scheduler.pending()
+
+
+def help_active_run(lease, wait_seconds=HELPER_WAIT_SECONDS, workers=PROVISION_WORKERS):
+    """Attach to the active run's shared batch and create users from it until it is drained or stopped.
+
+    Used for --helper when *lease* is held by another run, and for --worker
+    processes. The leader fetches, validates and publishes the batch; this
+    only claims.
+    """
+    holder = (lease.current() or {}).get("holder", "another run")
+    logger.info(f"Provisioning run already active ({holder}); attaching as a helper")
+    console(f"Another run is active ({holder}); helping with its batch")
+    backend = shared_queue_backend()
+    give_up = time.monotonic() + wait_seconds
+    queue = backend.attach(lease.holder, OnboardingUser.from_dict)
+    while queue is None:
+        # A dedicated worker may start before the leader; give up only once the wait is over
+        if time.monotonic() >= give_up:
+            logger.info("No open batch to help with; exiting")
+            console("No open batch to help with. Exiting.")
+            return
+        time.sleep(HELPER_POLL_SECONDS)
+        queue = backend.attach(lease.holder, OnboardingUser.from_dict)
+
+    headers = okta_headers()
+    directory = OktaUserDirectory.load()
+    directory.refresh(headers)
+    notifier = SlackNotificationAggregator()
+    dispatcher = NotificationDispatcher()
+    dispatcher.register(
+        "post_creation",
+        lambda **job: run_post_creation_tasks(notifier=notifier, **job)
+    )
+    dispatcher.start()
+    try:
+        scheduler = ProvisioningScheduler(_provision_handler(headers, directory, notifier, dispatcher),
+                                          max(1, workers), get_resolver(), queue)
+        results = scheduler.run()
+    finally:
+        dispatcher.shutdown(deadline=NOTIFICATION_DRAIN_SECONDS)
+        directory.save()
+        queue.close()
+    notifier.flush()
+    logger.info(f"Helper finished: {results['created']} created, {results['duplicate']} duplicates, "
+                f"{results['failed']} errors")
+    console(f"Helper finished: {results['created']} users created")
+    http_client.log_stats(logger)
+
+
+def load_carryover() -> set:
+    """Ticket IDs left unfinished by the previous run (they are provisioned first)."""
+    data = load_json(CARRYOVER_FILE, default={}) or {}
+    return set(data.get("ticket_ids", []))
+
+
+def save_carryover(users) -> bool:
+    return save_json(CARRYOVER_FILE, {
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "ticket_ids": [u.get("ticket_id") for u in users],
+        "tickets": [u.get("ticket_number") for u in users],
+    })
+
+
+def main(test_mode: bool = True, shadow: bool = False, shadow_latency_scale: float = 1.0,
+         budget_minutes: float = RUN_BUDGET_MINUTES, helper: bool = False, workers: int = PROVISION_WORKERS):
     """Fetch tickets, parse users, and create them in Okta.
 
     If *test_mode* is True, only the first user is processed so you can
     validate the flow safely.
+
+    If *shadow* is True, the whole batch runs end to end against the live
+    read APIs but every write is recorded instead of sent (see shadow_mode.py),
+    and a throughput/latency report is logged at the end. Nothing is saved
+    to the local caches.
+
+    No new user is started once *budget_minutes* have passed since the run
+    began; the rest are written to the carry-over file and go first next run.
+
+    Only one provisioning run is active at a time (see run_lease.py). If
+    another run holds the lease this one exits, or with *helper* claims
+    users from that run's batch instead (see help_active_run). Shadow runs
+    send no writes, so they neither take the lease nor wait for it; nor do
+    replay runs (--replay), which also work on a scratch copy of the caches.
+
+    *workers* is the number of local provisioning threads. Production runs
+    publish their batch to the shared work queue, so with 0 this run only
+    coordinates and --worker processes do the creating.
     """
     start_time = datetime.now()
+    run_started = time.monotonic()
+    deadline = run_started + budget_minutes * 60 if budget_minutes else None
     logger.info("=" * 60)
     logger.info(f"OKTA AUTOMATION STARTED - {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info("=" * 60)
-    
+
+    lease = None
+    if not shadow and not http_client.replaying():
+        lease = RunLease()
+        if not lease.acquire():
+            try:
+                if helper:
+                    help_active_run(lease, workers=workers)
+                else:
+                    holder = (lease.current() or {}).get("holder", "another run")
+                    logger.info(f"Another provisioning run is active ({holder}); exiting")
+                    console("Another provisioning run is active. Exiting.")
+            finally:
+                lease.release()
+            return
+
+    recorder = None
+    if shadow:
+        recorder = ShadowRecorder(latency_scale=shadow_latency_scale)
+        recorder.enable()
+        test_mode = False
+        console("SHADOW MODE - no writes will be sent")
+
     try:
         # Get Okta credentials for validation
         logger.info("Retrieving Okta API credentials...")
-        okta_token = get_okta_token()
-        headers = {
-            "Authorization": f"SSWS {okta_token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
+        headers = okta_headers()
         
         # Validate group mappings on startup
         logger.info("Validating department-to-group mappings...")
         validation_success = validate_group_mappings(headers)
         if not validation_success:
             logger.error("Group mapping validation failed. Check group IDs in configuration.")
-            print("Group mapping validation failed. Check logs for details.")
+            console("Group mapping validation failed. Check logs for details.")
             return
         else:
             logger.info("All group mappings validated successfully")
-            print("Group mappings validated")
+            console("Group mappings validated")
         
+        # Load existing Okta logins so duplicates are caught before any POST
+        logger.info("Refreshing Okta user directory cache...")
+        directory = OktaUserDirectory.load()
+        directory.refresh(headers)
+
         # Fetch and filter tickets
         logger.info("Fetching tickets from SolarWinds Service Desk...")
-        print("Fetching tickets from SolarWinds...")
+        console("Fetching tickets from SolarWinds...")
+        stage_start = time.monotonic()
         tickets = fetch_tickets()
-        users = filter_onboarding_users(tickets)
+        if recorder:
+            recorder.mark("fetch", time.monotonic() - stage_start)
+            stage_start = time.monotonic()
+        # Unchanged tickets reuse last run's parse; tickets no longer open are dropped from the cache
+        parse_cache = ParseCache.load()
+        users = filter_onboarding_users(tickets, parse_cache)
+        parse_cache.retain(t.get("id") for t in tickets if t.get("state") in ACTIVE_STATES)
+        logger.info(f"Parse cache: {parse_cache.stats['hits']} unchanged, {parse_cache.stats['parsed']} parsed, "
+                    f"{parse_cache.stats['evicted']} evicted")
+        if recorder:
+            recorder.mark("parse", time.monotonic() - stage_start)
         
         logger.info(f"Found {len(users)} onboarding users to process")
-        print(f"Found {len(users)} users to process")
+        console(f"Found {len(users)} users to process")
 
         if not users:
+            if not shadow:
+                parse_cache.save()
             logger.info("No onboarding users found. Exiting.")
-            print("No users found. Exiting.")
+            console("No users found. Exiting.")
             return
 
+        # Validate the whole batch before any Okta write
+        stage_start = time.monotonic()
+        validation, duplicate_count, skipped_count = prepare_batch(users, headers, directory, save_caches=not shadow,
+                                                                   parse_cache=parse_cache)
+        # Pre-flight duplicates never reach the ready list; POST-time ones are counted in it
+        preflight_duplicates = duplicate_count
+        if not shadow:
+            parse_cache.save()
+        if recorder:
+            recorder.mark("validate", time.monotonic() - stage_start)
+
         # Process users
-        iterable = users[:1] if test_mode else users
-        mode_msg = "TEST MODE - Processing first user only" if test_mode else f"PRODUCTION MODE - Processing all {len(users)} users"
+        # Most urgent first, so test mode picks the user who is needed soonest
+        resolver = get_resolver()
+        ready = sorted(validation.ready, key=lambda u: priority_key(u, resolver))
+        iterable = ready[:1] if test_mode else ready
+        mode_msg = "TEST MODE - Processing first user only" if test_mode else f"PRODUCTION MODE - Processing all {len(ready)} ready users"
         logger.info(f"{mode_msg}")
 
         success_count = 0
-        duplicate_count = 0
         error_count = 0
+        notifier = SlackNotificationAggregator()
+        # Shadow runs keep their leftovers apart so they are never replayed as real writes
+        dispatcher = NotificationDispatcher(spill_path=cache_path(SHADOW_SPILL_NAME)) if shadow else NotificationDispatcher()
+        dispatcher.register(
+            "post_creation",
+            lambda **job: run_post_creation_tasks(notifier=notifier, **job)
+        )
+        dispatcher.start()
 
-        for i, user in enumerate(iterable, 1):
-            logger.info(f"Processing user {i}/{len(iterable)}: {user['name']} — {user.get('title', 'No Title')} (Ticket #{user.get('ticket_number')})")
-            
-            # Process user
-            print(f"\nProcessing: {user['name']} ({user.get('title', 'No Title')})")
-            payload, work_email = build_okta_payload(user)
-            ticket_id = user.get('ticket_id')
-            ticket_number = user.get('ticket_number')
-            user_department = user.get('department')  # Extract department for group assignment
-            
-            # Track result for statistics
-            try:
-                result = create_okta_user(payload, headers, work_email, user_department, ticket_id, ticket_number)
-                # We'll need to modify create_okta_user to return a status
-                success_count += 1
-            except Exception as e:
-                error_count += 1
-                logger.error(f" Error processing {user['name']}: {str(e)}")
+        carried_over = load_carryover()
+        if carried_over:
+            logger.info(f"{len(carried_over)} users carried over from the previous run go first")
+        leftovers = []
+        # Fetch and validation can be slow; don't start creating users if another run took over meanwhile
+        if lease:
+            lease.check()
+        # A full production batch is published so --helper and --worker processes can claim from it
+        queue = shared_queue_backend().create(lease.holder, OnboardingUser.from_dict) if lease and not test_mode else None
+        stage_start = time.monotonic()
+        try:
+            success_count, duplicates, error_count, leftovers = provision_users(
+                iterable, headers, directory, notifier, dispatcher,
+                workers=workers, deadline=deadline, first_ticket_ids=carried_over, queue=queue, lease=lease)
+            duplicate_count += duplicates
+            if queue is not None:
+                logger.info(f"Users handled per run: {dict(queue.workers())}")
+            if not shadow and not test_mode:
+                save_carryover(leftovers)
+        finally:
+            if queue is not None:
+                queue.finish()
+                queue.close()
+            # Let background ticket updates finish (leftovers are spilled for the next run)
+            dispatch_stats = dispatcher.shutdown(deadline=NOTIFICATION_DRAIN_SECONDS)
+            if not shadow:
+                directory.save()
+            logger.info(f"Post-creation jobs: {dispatch_stats['completed']} completed, "
+                        f"{dispatch_stats['failed']} failed, {dispatch_stats['spilled']} spilled")
+
+        # Post the Slack digest for everyone created in this run
+        if notifier.flush():
+            logger.info(" Slack digest sent")
+        else:
+            logger.warning(" Slack digest failed for some users")
+        if recorder:
+            recorder.mark("provisioning", time.monotonic() - stage_start)
 
         # Log summary
         end_time = datetime.now()
@@ -229,25 +521,95 @@ def main(test_mode: bool = True):
         logger.info(f"Successful creations: {success_count}")
         logger.info(f"Duplicates skipped: {duplicate_count}")
         logger.info(f"Errors encountered: {error_count}")
-        logger.info(f"Total users processed: {len(iterable)}")
+        logger.info(f"Skipped by validation: {skipped_count}")
+        logger.info(f"Total users processed: {len(iterable) - len(leftovers) + preflight_duplicates}")
+        if budget_minutes:
+            used = (time.monotonic() - run_started) / 60
+            logger.info(f"Run budget: {used:.1f} of {budget_minutes:g} minutes used, "
+                        f"{len(leftovers)} users carried over to the next run")
+        fetched = fetch_stats()
+        logger.info(f"Ticket fetch: {fetched['pages']} pages, {fetched['bytes'] / 1024:.0f} KB, "
+                    f"{fetched['tickets']} tickets downloaded, {fetched['used']} used, "
+                    f"{fetched['refetches']} drift re-fetches")
+        http_client.log_stats(logger)
         logger.info("=" * 60)
+        if recorder:
+            recorder.log_report(len(iterable), logger)
         
         # Clean console summary
-        print(f"\nAutomation Complete!")
-        print(f"{success_count} users created successfully")
+        console(f"\nAutomation Complete!")
+        console(f"{success_count} users created successfully")
         if duplicate_count > 0:
-            print(f"{duplicate_count} duplicates skipped")
+            console(f"{duplicate_count} duplicates skipped")
         if error_count > 0:
-            print(f"{error_count} errors encountered")
-        print(f"Completed in {duration}")
-        print("Check logs for detailed information")
+            console(f"{error_count} errors encountered")
+        if skipped_count > 0:
+            console(f"{skipped_count} users skipped by validation (see log)")
+        if leftovers:
+            console(f"{len(leftovers)} users carried over to the next run (time budget reached)")
+        console(f"Completed in {duration}")
+        console("Check logs for detailed information")
         
+    except LeaseLost as e:
+        # The run that took over re-fetches and provisions whatever this one did not finish
+        logger.error(f" Run aborted: {str(e)}")
+        console(f" Run aborted: another run took over ({str(e)})")
     except Exception as e:
         logger.error(f" CRITICAL ERROR in main automation: {str(e)}", exc_info=True)
-        print(f" Critical error: {str(e)}")
+        console(f" Critical error: {str(e)}")
         raise
+    finally:
+        if recorder:
+            recorder.disable()
+        if lease:
+            lease.release()
 
 
 if __name__ == "__main__":
-    # Production mode - process all pending users
-    main(test_mode=False)
+    # --quiet keeps the file log but turns off console output (e.g. under Task Scheduler)
+    if "--quiet" in sys.argv:
+        setup_logging(quiet=True)
+    # --budget-minutes N overrides the run budget (0 = no limit)
+    budget = RUN_BUDGET_MINUTES
+    if "--budget-minutes" in sys.argv:
+        budget = float(sys.argv[sys.argv.index("--budget-minutes") + 1])
+    # --workers N sets the local provisioning threads (0 = coordinate only, --worker processes create)
+    workers = PROVISION_WORKERS
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    # --record FILE saves every HTTP call to a cassette; --replay FILE answers them from one
+    # (--replay-speed N divides the recorded latency, 0 = no delay)
+    cassette = None
+    scratch_cache = None
+    if "--record" in sys.argv:
+        cassette = Cassette.record(sys.argv[sys.argv.index("--record") + 1])
+    elif "--replay" in sys.argv:
+        speed = 1.0
+        if "--replay-speed" in sys.argv:
+            speed = float(sys.argv[sys.argv.index("--replay-speed") + 1])
+        cassette = Cassette.replay(sys.argv[sys.argv.index("--replay") + 1], speed)
+        # Replayed state (directory, parse cache, carry-over, spill) never touches the real caches
+        scratch_cache = use_scratch_copy()
+    http_client.set_cassette(cassette)
+    try:
+        # --shadow runs the full batch with writes recorded instead of sent
+        if "--shadow" in sys.argv:
+            main(shadow=True, budget_minutes=budget)
+        elif "--worker" in sys.argv:
+            # Worker only: claim from the active run's batch, never lead a run
+            worker_lease = RunLease()
+            try:
+                help_active_run(worker_lease, workers=max(1, workers))
+            finally:
+                worker_lease.release()
+        else:
+            # Production mode - process all pending users
+            # (--helper: if another run is active, help create its users instead of exiting)
+            main(test_mode=False, budget_minutes=budget, helper="--helper" in sys.argv, workers=workers)
+    finally:
+        if cassette is not None:
+            http_client.set_cassette(None)
+            if cassette.mode == "record":
+                cassette.save()
+        if scratch_cache:
+            shutil.rmtree(scratch_cache, ignore_errors=True)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Okta Onboarding Daemon
+Resident alternative to the scheduled okta_batch_create.py run. Credentials,
+the HTTP session, group validation and the user/manager caches are set up
+once; new tickets arrive through a webhook endpoint that Samanage calls
+out to, with a cheap polling loop as a fallback for missed events.
+
+    python okta_daemon.py [--port 8085] [--poll-interval 300] [--quiet]
+
+Webhook: POST /tickets with a JSON body containing the incident id
+({"id": 123}, {"incident": {"id": 123}} or a list of either) and the
+shared secret from OKTA_WEBHOOK_SECRET in the X-Webhook-Token header.
+GET /health returns the daemon's counters.
+"""
+
+import argparse
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import http_client
+from config import get_okta_token
+from log_config import setup_logging, console
+from ticket_extractor import fetch_tickets, fetch_ticket, filter_onboarding_users, is_onboarding_ticket
+from okta_groups import validate_group_mappings
+from okta_user_directory import OktaUserDirectory
+from notification_dispatcher import NotificationDispatcher
+from slack_integration import SlackNotificationAggregator
+from okta_batch_create import prepare_batch, provision_users, run_post_creation_tasks, NOTIFICATION_DRAIN_SECONDS
+from run_lease import RunLease, LeaseLost
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_PORT = 8085
+# Fallback poll: only the newest pages, with a full sweep now and then
+POLL_INTERVAL_SECONDS = 300
+POLL_PAGES = 2
+FULL_SWEEP_SECONDS = 6 * 3600
+# Re-check group IDs and pull Okta user changes this often
+GROUP_VALIDATION_SECONDS = 6 * 3600
+DIRECTORY_REFRESH_SECONDS = 300
+# Wait this long after the first event so a burst of webhooks becomes one batch
+BATCH_WINDOW_SECONDS = 2.0
+MAX_WEBHOOK_BODY = 64 * 1024
+
+
+def extract_ticket_ids(payload) -> List[int]:
+    """Pull incident ids out of a webhook body; unknown shapes yield []."""
+    items = payload if isinstance(payload, list) else [payload]
+    ids = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        incident = item.get("incident") if isinstance(item.get("incident"), dict) else item
+        ticket_id = incident.get("id")
+        try:
+            ids.append(int(ticket_id))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+class OnboardingDaemon:
+    """Keeps the provisioning pipeline warm and feeds it tickets from webhooks and polling."""
+
+    def __init__(self, port: int = DEFAULT_WEBHOOK_PORT, host: str = "0.0.0.0",
+                 poll_interval: float = POLL_INTERVAL_SECONDS, webhook_secret: Optional[str] = None):
+        self.port = port
+        self.host = host
+        self.poll_interval = poll_interval
+        self.webhook_secret = webhook_secret if webhook_secret is not None else os.getenv("OKTA_WEBHOOK_SECRET")
+        self.headers: Dict[str, str] = {}
+        self.directory: Optional[OktaUserDirectory] = None
+        self.dispatcher: Optional[NotificationDispatcher] = None
+        self.notifier: Optional[SlackNotificationAggregator] = None
+        self._intake: "queue.Queue" = queue.Queue()
+        # ticket id -> updated_at of the version we last handled, so unchanged tickets are skipped
+        self._handled: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+        # Held for the daemon's lifetime, so scheduled okta_batch_create runs exit instead of overlapping
+        self.lease = RunLease()
+        self._threads: List[threading.Thread] = []
+        self._last_group_check = 0.0
+        self._last_directory_refresh = 0.0
+        self._last_full_sweep = 0.0
+        self.stats = {"webhook_events": 0, "polls": 0, "batches": 0, "created": 0, "duplicates": 0, "errors": 0}
+
+    # --- warm state -------------------------------------------------------
+
+    def warm_up(self) -> bool:
+        """Load credentials and caches once. Returns False if group validation fails."""
+        self.headers = {
+            "Authorization": f"SSWS {get_okta_token()}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        if not self._check_groups(force=True):
+            return False
+        self.directory = OktaUserDirectory.load()
+        self.directory.refresh(self.headers)
+        self._last_directory_refresh = time.monotonic()
+
+        self.notifier = SlackNotificationAggregator()
+        self.dispatcher = NotificationDispatcher()
+        self.dispatcher.register(
+            "post_creation",
+            lambda **job: run_post_creation_tasks(notifier=self.notifier, **job)
+        )
+        self.dispatcher.start()
+        logger.info(f"Daemon warm: {len(self.directory)} Okta logins cached")
+        return True
+
+    def _check_groups(self, force: bool = False) -> bool:
+        if not force and time.monotonic() - self._last_group_check < GROUP_VALIDATION_SECONDS:
+            return True
+        ok = validate_group_mappings(self.headers)
+        if ok:
+            self._last_group_check = time.monotonic()
+        else:
+            logger.error("Group mapping validation failed. Check group IDs in configuration.")
+        return ok
+
+    def _refresh_directory(self) -> None:
+        if time.monotonic() - self._last_directory_refresh >= DIRECTORY_REFRESH_SECONDS:
+            self.directory.refresh(self.headers)
+            self._last_directory_refresh = time.monotonic()
+
+    # --- intake -----------------------------------------------------------
+
+    def submit_ids(self, ticket_ids: List[int]) -> None:
+        for ticket_id in ticket_ids:
+            self._intake.put(ticket_id)
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                full = time.monotonic() - self._last_full_sweep >= FULL_SWEEP_SECONDS
+                tickets = fetch_tickets() if full else fetch_tickets(max_pages=POLL_PAGES)
+                if full:
+                    # A full sweep re-checks everything, including tickets whose creation failed
+                    self._handled = {}
+                    self._last_full_sweep = time.monotonic()
+                self.stats["polls"] += 1
+                for ticket in tickets:
+                    self._intake.put(ticket)
+            except Exception as e:
+                logger.error(f"Ticket poll failed: {str(e)}")
+
+    def _next_batch(self) -> List:
+        """Block for the first event, then gather whatever else arrives within the batch window."""
+        try:
+            items = [self._intake.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._intake.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _resolve_tickets(self, items: List) -> List[Dict]:
+        """Turn queued ids/tickets into unique, unhandled onboarding tickets."""
+        tickets: Dict[int, Dict] = {}
+        for item in items:
+            ticket = item if isinstance(item, dict) else fetch_ticket(item)
+            if ticket and ticket.get("id") is not None:
+                tickets[ticket["id"]] = ticket
+        return [
+            t for t in tickets.values()
+            if is_onboarding_ticket(t) and self._handled.get(t["id"]) != t.get("updated_at", "")
+        ]
+
+    # --- processing -------------------------------------------------------
+
+    def process(self, items: List) -> None:
+        tickets = self._resolve_tickets(items)
+        if not tickets:
+            return
+        if not self._check_groups():
+            # Keep the tickets unhandled so they are retried once the mapping is fixed
+            return
+        self._refresh_directory()
+
+        users = filter_onboarding_users(tickets)
+        if users:
+            validation, duplicates, _ = prepare_batch(users, self.headers, self.directory)
+            created, more_duplicates, errors, _ = provision_users(
+                validation.ready, self.headers, self.directory, self.notifier, self.dispatcher, lease=self.lease)
+            self.directory.save()
+            # The post-creation jobs queue this batch's Slack notifications; let them
+            # finish so the digest covers this batch rather than going out with the next
+            if not self.dispatcher.wait_idle(NOTIFICATION_DRAIN_SECONDS):
+                logger.warning("Post-creation jobs still running; their notifications go out with the next batch")
+            self.notifier.flush()
+            self.stats["batches"] += 1
+            self.stats["created"] += created
+            self.stats["duplicates"] += duplicates + more_duplicates
+            self.stats["errors"] += errors
+            logger.info(f"Daemon batch: {created} created, {duplicates + more_duplicates} duplicates, "
+                        f"{errors} errors from {len(tickets)} tickets")
+
+        # Failed creations leave the ticket open; they are retried when the ticket
+        # changes or on the next full sweep
+        for ticket in tickets:
+            self._handled[ticket["id"]] = ticket.get("updated_at", "")
+
+    def _work_loop(self) -> None:
+        while not self._stop.is_set():
+            items = self._next_batch()
+            if not items:
+                continue
+            try:
+                self.process(items)
+            except LeaseLost as e:
+                # Another run holds the lease now; provisioning alongside it would duplicate work
+                logger.error(f"Daemon stopping: {str(e)}")
+                self._stop.set()
+            except Exception as e:
+                logger.error(f"Daemon batch failed: {str(e)}", exc_info=True)
+
+    # --- webhook server ---------------------------------------------------
+
+    def _make_handler(self):
+        daemon = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(f"webhook {self.address_string()}: {format % args}")
+
+            def _reply(self, status: int, body: Dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._reply(200, {"ok": True, "queued": daemon._intake.qsize(), **daemon.stats})
+                else:
+                    self._reply(404, {"ok": False})
+
+            def do_POST(self):
+                if self.path != "/tickets":
+                    self._reply(404, {"ok": False})
+                    return
+                token = self.headers.get("X-Webhook-Token", "")
+                if not hmac.compare_digest(token, daemon.webhook_secret or ""):
+                    self._reply(401, {"ok": False})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_WEBHOOK_BODY:
+                    self._reply(413, {"ok": False})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"ok": False, "error": "invalid JSON"})
+                    return
+                ticket_ids = extract_ticket_ids(payload)
+                daemon.stats["webhook_events"] += 1
+                daemon.submit_ids(ticket_ids)
+                self._reply(202, {"ok": True, "queued": len(ticket_ids)})
+
+        return WebhookHandler
+
+    # --- lifecycle --------------------------------------------------------
+
+    def start(self) -> bool:
+        if not self.lease.acquire():
+            holder = (self.lease.current() or {}).get("holder", "another run")
+            logger.error(f"Another provisioning run is active ({holder}); daemon not started")
+            self.lease.release()
+            return False
+        if not self.warm_up():
+            self.lease.release()
+            return False
+        if self.webhook_secret:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True))
+            logger.info(f"Webhook listening on {self.host}:{self.port}/tickets")
+        else:
+            logger.warning("OKTA_WEBHOOK_SECRET is not set; webhook disabled, polling only")
+        self._threads.append(threading.Thread(target=self._poll_loop, name="ticket-poll", daemon=True))
+        self._threads.append(threading.Thread(target=self._work_loop, name="provisioning", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        # Pick up anything that arrived while the daemon was down
+        self._last_full_sweep = time.monotonic()
+        for ticket in fetch_tickets():
+            self._intake.put(ticket)
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=10)
+        if self.dispatcher:
+            self.dispatcher.shutdown(deadline=NOTIFICATION_DRAIN_SECONDS)
+        # After the dispatcher, so notifications its last jobs queued are sent too
+        if self.notifier and not self.notifier.flush():
+            logger.warning(" Slack digest failed for some users")
+        if self.directory:
+            self.directory.save()
+        http_client.log_stats(logger)
+        self.lease.release()
+        logger.info(f"Daemon stopped: {self.stats}")
+
+    def run_forever(self) -> None:
+        if not self.start():
+            console("Startup failed. Check logs for details.")
+            return
+        console(f"Okta onboarding daemon running (poll every {self.poll_interval}s). Ctrl+C to stop.")
+        try:
+            while not self._stop.wait(60):
+                pass
+        except KeyboardInterrupt:
+            console("Stopping...")
+        finally:
+            self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Okta onboarding daemon")
+    parser.add_argument("--port", type=int, default=int(os.getenv("OKTA_DAEMON_PORT", DEFAULT_WEBHOOK_PORT)))
+    parser.add_argument("--host", default=os.getenv("OKTA_DAEMON_HOST", "0.0.0.0"))
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    if args.quiet:
+        setup_logging(quiet=True)
+    OnboardingDaemon(port=args.port, host=args.host, poll_interval=args.poll_interval).run_forever()
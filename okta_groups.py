@@ -6,16 +6,19 @@ Handles automatic assignment of users to groups based on department.
 
 import requests
 import logging
+import http_client
 from typing import List, Dict
-from config import OKTA_ORG_URL, get_okta_token, get_groups_for_department
+from config import OKTA_ORG_URL, get_okta_token
+from group_catalog import GroupCatalog
+from department_resolver import get_resolver
 
 logger = logging.getLogger(__name__)
 
 def assign_user_to_groups(user_id: str, department: str, headers: Dict[str, str]) -> bool:
     """Assign a user to appropriate groups based on their department."""
     try:
-        # Get group IDs for the department
-        group_ids = get_groups_for_department(department)
+        # Get group IDs for the department (normalized/alias-aware, memoized)
+        group_ids = get_resolver().groups_for(department)
         
         if not group_ids:
             logger.warning(f"No groups found for department: {department}")
@@ -28,7 +31,7 @@ def assign_user_to_groups(user_id: str, department: str, headers: Dict[str, str]
             try:
                 # Add user to group
                 url = f"{OKTA_ORG_URL}/api/v1/groups/{group_id}/users/{user_id}"
-                response = requests.put(url, headers=headers, timeout=30)
+                response = http_client.put(url, headers=headers, timeout=30)
                 
                 if response.status_code in (200, 204):
                     logger.info(f"Added user {user_id} to group {group_id}")
@@ -66,7 +69,7 @@ def get_user_groups(user_id: str, headers: Dict[str, str]) -> List[Dict]:
     """Get all groups a user is currently assigned to."""
     try:
         url = f"{OKTA_ORG_URL}/api/v1/users/{user_id}/groups"
-        response = requests.get(url, headers=headers, timeout=30)
+        response = http_client.get(url, headers=headers, timeout=30)
         
         if response.status_code == 200:
             groups = response.json()
@@ -84,7 +87,7 @@ def get_group_info(group_id: str, headers: Dict[str, str]) -> Dict:
     """Get information about a specific group."""
     try:
         url = f"{OKTA_ORG_URL}/api/v1/groups/{group_id}"
-        response = requests.get(url, headers=headers, timeout=30)
+        response = http_client.get(url, headers=headers, timeout=30, cache=True)
         
         if response.status_code == 200:
             group_info = response.json()
@@ -100,17 +103,9 @@ def get_group_info(group_id: str, headers: Dict[str, str]) -> Dict:
 def list_all_groups(headers: Dict[str, str]) -> List[Dict]:
     """List all groups in the Okta org (for setup/configuration purposes)."""
     try:
-        url = f"{OKTA_ORG_URL}/api/v1/groups"
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        if response.status_code == 200:
-            groups = response.json()
-            logger.info(f"Retrieved {len(groups)} total groups from Okta")
-            return groups
-        else:
-            logger.error(f"Failed to list groups: {response.status_code}")
-            return []
-            
+        groups = GroupCatalog.load(headers).groups
+        logger.info(f"Retrieved {len(groups)} total groups from Okta")
+        return groups
     except Exception as e:
         logger.error(f"Error listing groups: {str(e)}")
         return []
@@ -118,18 +113,33 @@ def list_all_groups(headers: Dict[str, str]) -> List[Dict]:
 def validate_group_mappings(headers: Dict[str, str]) -> bool:
     """Validate that all group IDs in the mapping exist in Okta."""
     from config import DEPARTMENT_GROUP_MAPPING
-    
+
+    # Always re-fetch: a group deleted since the catalog was cached must not pass.
+    # The pages are conditional GETs, so an unchanged catalog costs only 304s.
+    try:
+        catalog = GroupCatalog.load(headers, force_refresh=True)
+    except Exception as e:
+        logger.warning(f"Group catalog unavailable, validating groups one by one: {str(e)}")
+        catalog = None
+
     invalid_count = 0
     total_count = len(DEPARTMENT_GROUP_MAPPING)
     
     for department, group_id in DEPARTMENT_GROUP_MAPPING.items():
-        group_info = get_group_info(group_id, headers)
+        # Check the catalog first; only ask Okta about IDs it doesn't know
+        group_info = catalog.get(group_id) if catalog else None
+        if not group_info:
+            group_info = get_group_info(group_id, headers)
         if group_info:
             # Only log to file, not console
             logger.debug(f"Group mapping valid: {department} → {group_info.get('profile', {}).get('name', group_id)}")
         else:
             invalid_count += 1
             logger.error(f"Invalid group mapping: {department} → {group_id} (group not found)")
+            if catalog:
+                suggestions = ", ".join(f"'{g['profile']['name']}' ({g['id']})" for g, _ in catalog.suggest(department, 3))
+                if suggestions:
+                    logger.error(f"  Possible groups for {department}: {suggestions}")
     
     if invalid_count == 0:
         logger.info(f"All {total_count} group mappings validated successfully")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Okta User Directory Cache
+Keeps a local index of existing Okta logins so duplicates are caught before
+any POST to /api/v1/users.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from config import OKTA_ORG_URL
+from cache_store import load_json, save_json
+from okta_api import iter_pages
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_CACHE_FILE = "okta_user_directory.json"
+# Do a full reload this often; in between only users changed since the last sync are fetched
+FULL_RELOAD_DAYS = 7
+PAGE_LIMIT = 200
+
+
+class OktaUserDirectory:
+    """Login -> {id, status, second_email} index of Okta users, persisted under ./cache.
+
+    second_email is the hire's personal email (profile.secondEmail), which
+    tells a returning hire apart from a different person with the same name.
+    """
+
+    def __init__(self, users: Optional[Dict[str, Dict]] = None, last_synced: Optional[str] = None,
+                 last_full_sync: Optional[str] = None, cache_file: str = DIRECTORY_CACHE_FILE):
+        self.users: Dict[str, Dict] = users or {}
+        self.last_synced = last_synced          # Okta lastUpdated watermark (server time)
+        self.last_full_sync = last_full_sync    # local ISO timestamp of the last full reload
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cache_file: str = DIRECTORY_CACHE_FILE) -> "OktaUserDirectory":
+        """Load the directory from disk (empty if there is no cache yet)."""
+        data = load_json(cache_file, default={}) or {}
+        return cls(
+            users=data.get("users", {}),
+            last_synced=data.get("last_synced"),
+            last_full_sync=data.get("last_full_sync"),
+            cache_file=cache_file,
+        )
+
+    def save(self) -> bool:
+        with self._lock:
+            data = {
+                "users": self.users,
+                "last_synced": self.last_synced,
+                "last_full_sync": self.last_full_sync,
+            }
+        return save_json(self.cache_file, data)
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def contains(self, login: str) -> bool:
+        """Return True if an Okta user with this login already exists."""
+        return login.lower() in self.users
+
+    def status(self, login: str) -> Optional[str]:
+        """Return the Okta status (ACTIVE, DEPROVISIONED, ...) for a login, if known."""
+        user = self.users.get(login.lower())
+        return user.get("status") if user else None
+
+    def second_email(self, login: str) -> Optional[str]:
+        """Return the personal email stored on the Okta account for a login, if known."""
+        user = self.users.get(login.lower())
+        return user.get("second_email") if user else None
+
+    def add(self, login: str, user_id: str, status: str = "ACTIVE", second_email: Optional[str] = None) -> None:
+        """Record a user created during this run."""
+        with self._lock:
+            self.users[login.lower()] = {"id": user_id, "status": status,
+                                         "second_email": (second_email or "").lower() or None}
+
+    @staticmethod
+    def _index_into(users: Dict[str, Dict], page, watermark: Optional[str]) -> Optional[str]:
+        """Add a page of Okta users to *users*; return the newest lastUpdated seen."""
+        for user in page:
+            login = user.get("profile", {}).get("login")
+            if not login:
+                continue
+            second_email = (user.get("profile", {}).get("secondEmail") or "").lower() or None
+            users[login.lower()] = {"id": user.get("id"), "status": user.get("status"), "second_email": second_email}
+            updated = user.get("lastUpdated")
+            # ISO-8601 strings from Okta compare correctly as text
+            if updated and (not watermark or updated > watermark):
+                watermark = updated
+        return watermark
+
+    def _index_page(self, page) -> None:
+        with self._lock:
+            self.last_synced = self._index_into(self.users, page, self.last_synced)
+
+    def _needs_full_reload(self) -> bool:
+        if not self.users or not self.last_synced or not self.last_full_sync:
+            return True
+        try:
+            last_full = datetime.fromisoformat(self.last_full_sync)
+        except ValueError:
+            return True
+        return datetime.now() - last_full > timedelta(days=FULL_RELOAD_DAYS)
+
+    def full_reload(self, headers: Dict[str, str]) -> int:
+        """Bulk-load every user with paginated GET /api/v1/users.
+
+        The new index replaces the old one only once every page has loaded, so
+        a failure part-way keeps the previous (complete) index.
+        """
+        url = f"{OKTA_ORG_URL}/api/v1/users"
+        users: Dict[str, Dict] = {}
+        watermark = None
+        # The plain list leaves out deprovisioned users; load them too so rehires are detected
+        for params in ({"limit": PAGE_LIMIT}, {"limit": PAGE_LIMIT, "search": 'status eq "DEPROVISIONED"'}):
+            for page in iter_pages(url, headers, params):
+                watermark = self._index_into(users, page, watermark)
+        with self._lock:
+            self.users = users
+            self.last_synced = watermark
+        self.last_full_sync = datetime.now().isoformat(timespec="seconds")
+        logger.info(f"Loaded {len(self.users)} Okta logins into the user directory cache")
+        return len(self.users)
+
+    def incremental_refresh(self, headers: Dict[str, str]) -> int:
+        """Fetch only users updated since the last sync."""
+        url = f"{OKTA_ORG_URL}/api/v1/users"
+        params = {"limit": PAGE_LIMIT, "filter": f'lastUpdated gt "{self.last_synced}"'}
+        changed = 0
+        for page in iter_pages(url, headers, params):
+            self._index_page(page)
+            changed += len(page)
+        logger.info(f"User directory cache refreshed: {changed} changed users, {len(self.users)} total")
+        return changed
+
+    def refresh(self, headers: Dict[str, str]) -> bool:
+        """Bring the directory up to date and save it. Returns False if Okta could not be reached."""
+        try:
+            if self._needs_full_reload():
+                self.full_reload(headers)
+            else:
+                self.incremental_refresh(headers)
+        except Exception as e:
+            logger.warning(f"User directory refresh failed, using cached logins ({len(self.users)}): {str(e)}")
+            return False
+        self.save()
+        return True
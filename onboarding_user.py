@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Onboarding User Record
+Compact record for one parsed onboarding ticket. Fields live in __slots__
+and the values that are the same for every user (organization, swrole, ...)
+live on the class, so a large backfill holds one small object per user
+instead of a 20-key dict.
+
+The record reads like the dicts the rest of the pipeline was written
+against (user["name"], user.get("title"), "title" in user), so callers
+don't need to change, and it serializes straight to the Okta payload.
+"""
+
+from typing import Dict, Iterator, Tuple
+
+EMAIL_DOMAIN = "filevine.com"
+
+
+class OnboardingUser:
+    """Typed onboarding record with a dict-style read/write interface.
+
+    Only the names in FIELDS can be set; a field that was never set is
+    "missing" exactly like an absent dict key.
+    """
+
+    __slots__ = (
+        "ticket_id", "ticket_number", "ticket_state", "ticket_created",
+        "name", "title", "department", "start_date",
+        "streetAddress", "city", "state", "zipCode", "countryCode", "timezone",
+        "manager_email", "managerId", "work_email", "phone", "personal_email",
+    )
+    FIELDS = __slots__
+
+    # Same for every user; read from the class, never stored per record
+    preferredLanguage = "en"
+    organization = "Filevine"
+    swrole = "Requester"
+    primary = True
+    CONSTANTS = ("preferredLanguage", "organization", "swrole", "primary")
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OnboardingUser":
+        """Build a record from a plain dict; the constant keys are ignored."""
+        if isinstance(data, cls):
+            return data
+        return cls(**{k: v for k, v in data.items() if k not in cls.CONSTANTS})
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    # --- dict-style access ------------------------------------------------
+
+    def __getitem__(self, key: str):
+        if key in OnboardingUser.CONSTANTS:
+            return getattr(self, key)
+        if key not in OnboardingUser.FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in OnboardingUser.FIELDS:
+            raise KeyError(f"Unknown onboarding field: {key}")
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        if key in OnboardingUser.CONSTANTS:
+            return True
+        return key in OnboardingUser.FIELDS and hasattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        for key in OnboardingUser.FIELDS:
+            if hasattr(self, key):
+                yield key
+        yield from OnboardingUser.CONSTANTS
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        for key in self.keys():
+            yield key, getattr(self, key)
+
+    __iter__ = keys
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (OnboardingUser, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"OnboardingUser(ticket_number={self.get('ticket_number')!r}, name={self.get('name')!r})"
+
+    # --- Okta payload -----------------------------------------------------
+
+    def split_name(self) -> Tuple[str, str]:
+        parts = self["name"].strip().split()
+        return parts[0], " ".join(parts[1:]) if len(parts) > 1 else ""
+
+    def to_okta_payload(self) -> Tuple[Dict, str]:
+        """Return (Okta create-user payload, work email), built directly from the fields."""
+        first_name, last_name = self.split_name()
+        work_email = self.get("work_email") or f"{first_name.lower()}{last_name.lower()}@{EMAIL_DOMAIN}"
+        get = self.get
+        payload = {
+            "profile": {
+                "firstName": first_name,
+                "lastName": last_name,
+                "displayName": f"{first_name} {last_name}",
+                "email": work_email,
+                "login": work_email,
+                "mobilePhone": get("phone", ""),
+                "secondEmail": get("personal_email", ""),
+                "streetAddress": get("streetAddress", ""),
+                "city": get("city", ""),
+                "state": get("state", "UT"),
+                "zipCode": get("zipCode", ""),
+                "countryCode": get("countryCode", "US"),
+                "department": get("department", ""),
+                "title": get("title", ""),
+                "managerId": get("managerId", ""),
+                # Use manager_email for Okta's 'manager' field
+                "manager": get("manager_email", ""),
+                "preferredLanguage": self.preferredLanguage,
+                "timezone": get("timezone", "America/Denver"),  # Use timezone from address parsing
+                "organization": self.organization,
+                "swrole": self.swrole,
+                "primary": self.primary
+            }
+        }
+        return payload, work_email
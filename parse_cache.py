@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Parse Result Cache
+Remembers the parsed OnboardingUser (and its static validation result) for
+each open ticket, keyed by ticket id and a version derived from
+updated_at. Validation results also record the department mapping version
+they were computed against. An unchanged ticket is neither parsed nor statically validated
+again on the next run; tickets that leave the active set are evicted.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from cache_store import load_json, save_json
+from onboarding_user import OnboardingUser
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_FILE = "parse_cache.json"
+# Bump when parse_ticket starts producing different fields, so cached records are re-parsed
+PARSE_SCHEMA = 3
+
+
+def ticket_version(ticket: Dict) -> str:
+    """updated_at when the API gives one, otherwise a hash of the fields parse_ticket reads."""
+    if ticket.get("updated_at"):
+        return str(ticket["updated_at"])
+    content = json.dumps([ticket.get("name"), ticket.get("state"), ticket.get("custom_fields_values")],
+                         sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """ticket id -> {version, user, static} where user is None for tickets that didn't parse."""
+
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None, cache_file: str = PARSE_CACHE_FILE):
+        self.entries: Dict[str, Dict] = entries or {}
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "parsed": 0, "evicted": 0}
+
+    @classmethod
+    def load(cls, cache_file: str = PARSE_CACHE_FILE) -> "ParseCache":
+        return cls(load_json(cache_file, default={}) or {}, cache_file)
+
+    def save(self) -> bool:
+        with self._lock:
+            return save_json(self.cache_file, self.entries)
+
+    def parse(self, ticket: Dict, parser: Callable[[Dict], OnboardingUser]):
+        """Return the cached record for an unchanged ticket, otherwise parse and remember it."""
+        ticket_id = ticket.get("id")
+        if ticket_id is None:
+            return parser(ticket)
+        key, version = str(ticket_id), ticket_version(ticket)
+        entry = self.entries.get(key)
+        if entry and entry.get("version") == version and entry.get("schema") == PARSE_SCHEMA:
+            with self._lock:
+                self.stats["hits"] += 1
+            # A fresh record each time, so later mutations (work_email, managerId) never leak into the cache
+            return OnboardingUser.from_dict(entry["user"]) if entry.get("user") else {}
+
+        user = parser(ticket)
+        with self._lock:
+            self.stats["parsed"] += 1
+            self.entries[key] = {"version": version, "schema": PARSE_SCHEMA,
+                                 "user": user.to_dict() if user else None}
+        return user
+
+    def check_static(self, user, checker: Callable, rules_version: str = "") -> Tuple[List[str], List[str]]:
+        """Memoized static validation for a parsed user (see batch_validation.check_static).
+
+        *rules_version* identifies the department/group mapping the result was
+        computed against; a result cached under another version is recomputed.
+        """
+        entry = self.entries.get(str(user.get("ticket_id")))
+        if entry is None:
+            return checker(user)
+        if "static" not in entry or entry.get("static_version") != rules_version:
+            invalid, warnings = checker(user)
+            with self._lock:
+                entry["static"] = [invalid, warnings]
+                entry["static_version"] = rules_version
+        invalid, warnings = entry["static"]
+        return list(invalid), list(warnings)
+
+    def retain(self, ticket_ids: Iterable) -> int:
+        """Drop every ticket not in *ticket_ids* (the current active set). Returns how many were dropped."""
+        keep = {str(t) for t in ticket_ids}
+        with self._lock:
+            stale = [key for key in self.entries if key not in keep]
+            for key in stale:
+                del self.entries[key]
+            self.stats["evicted"] += len(stale)
+        return len(stale)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Provisioning Scheduler
+Priority queue for provisioning work. The most urgent user is always
+handed out next: earliest start date, then oldest ticket, then the
+department with the tightest SLA. When a run is slow or stopped early,
+the hire starting tomorrow is never waiting behind one starting next month.
+
+The queue itself is pluggable (see work_queue.py): a local heap by default,
+or a shared SQLite batch that helper processes claim from as well.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from work_queue import MemoryWorkQueue
+
+logger = logging.getLogger(__name__)
+
+# Hours within which a new hire in the department should be provisioned (lower goes first).
+# Keys are canonical DEPARTMENT_GROUP_MAPPING names; anything else gets DEFAULT_SLA_HOURS.
+DEPARTMENT_SLA_HOURS: Dict[str, float] = {}
+DEFAULT_SLA_HOURS = 72
+# Users without a start date sort after every dated one
+NO_START_DATE = "9999-12-31"
+PROVISION_WORKERS = 4
+# How often a coordinator with no local workers checks whether the shared queue has drained
+IDLE_POLL_SECONDS = 2
+
+
+def _timestamp(value) -> float:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("inf")
+
+
+def priority_key(user, resolver=None) -> Tuple[str, float, float]:
+    """(start date, ticket created, department SLA) - smaller is more urgent."""
+    department = user.get("department")
+    if resolver is not None:
+        department = resolver.resolve(department) or department
+    return (
+        user.get("start_date") or NO_START_DATE,
+        _timestamp(user.get("ticket_created")),
+        DEPARTMENT_SLA_HOURS.get(department, DEFAULT_SLA_HOURS),
+    )
+
+
+class ProvisioningScheduler:
+    """Queue of pending users drained by a pool of worker threads, most urgent first.
+
+    *handler(user, position, total)* does the work for one user and returns
+    a result label ("created", "duplicate", "failed"); run() returns the
+    count per label for this process. *queue* defaults to a MemoryWorkQueue.
+    With a shared queue, *workers* may be 0: this process only waits while
+    other processes drain it.
+
+    With a *lease* (run_lease.RunLease), nothing more is claimed or started
+    once the lease is lost; check lease_lost after run().
+    """
+
+    def __init__(self, handler: Callable, workers: int = PROVISION_WORKERS, resolver=None, queue=None,
+                 lease=None):
+        self.handler = handler
+        self.workers = max(0, workers)
+        self.resolver = resolver
+        self.queue = queue if queue is not None else MemoryWorkQueue()
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._handed_out = 0
+        self.results: Counter = Counter()
+
+    def add(self, user, first: bool = False) -> None:
+        """Queue a user; *first* puts them ahead of everything else (carried over from a cut-short run)."""
+        self.queue.put(user, (0 if first else 1,) + priority_key(user, self.resolver))
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    @property
+    def lease_lost(self) -> bool:
+        return self.lease is not None and not self.lease.valid()
+
+    def _next(self) -> Optional[Tuple[int, object]]:
+        if self.lease_lost:
+            self.stop()
+            return None
+        user = self.queue.claim()
+        if user is None:
+            return None
+        if self.lease_lost:
+            # Left claimed; on a shared queue it is handed out again once the claim expires
+            self.stop()
+            return None
+        with self._lock:
+            self._handed_out += 1
+            return self._handed_out, user
+
+    def _worker(self, total: int) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            position, user = item
+            try:
+                result = self.handler(user, position, total)
+            except Exception as e:
+                logger.error(f" Error processing {user.get('name', 'Unknown')}: {str(e)}")
+                result = "failed"
+            self.queue.complete(user, result)
+            with self._lock:
+                self.results[result] += 1
+
+    def run(self, deadline: Optional[float] = None) -> Counter:
+        """Process every queued user and return the result counts.
+
+        With *deadline* (a time.monotonic() value), no new user is started
+        after it passes; users already in progress finish.
+        """
+        timer = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stop()
+            else:
+                timer = threading.Timer(remaining, self.stop)
+                timer.daemon = True
+                timer.start()
+        try:
+            self._drain()
+        finally:
+            if timer:
+                timer.cancel()
+        return self.results
+
+    def _drain(self) -> None:
+        if self.workers == 0:
+            while len(self.queue) and self.queue.is_active():
+                if self.lease_lost:
+                    self.stop()
+                    return
+                time.sleep(IDLE_POLL_SECONDS)
+            return
+        total = len(self)
+        if self.workers == 1 or total <= 1:
+            self._worker(total)
+        else:
+            threads = [threading.Thread(target=self._worker, args=(total,), name=f"provision-{i}", daemon=True)
+                       for i in range(min(self.workers, total))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    def stop(self) -> None:
+        """Stop handing out work; users already in progress finish."""
+        self.queue.stop()
+
+    def pending(self) -> List:
+        """Users not handed out yet, most urgent first."""
+        return self.queue.pending()
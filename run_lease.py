@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Run Lease
+Cross-process lock so only one provisioning run is active at a time, even
+when Task Scheduler starts a new run before the last one finished. The
+lease lives in a small SQLite database under ./cache, is renewed by a
+heartbeat thread, and can be taken over once its holder stops renewing it
+(crashed or killed run).
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from cache_store import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Local file only: SQLite's WAL locking does not work over NFS/SMB, so this is shared by
+# processes on one host. Sharing work between hosts needs a server-backed work_queue backend.
+COORDINATION_DB = os.getenv("OKTA_COORDINATION_DB") or cache_path("coordination.db")
+LEASE_TTL_SECONDS = 60
+# Filesystem types (from /proc/mounts) the coordination database must not live on
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "fuse.sshfs", "afs")
+
+
+class LeaseLost(RuntimeError):
+    """Raised when a run finds another run has taken its lease over."""
+
+
+def is_network_path(path: str) -> bool:
+    """True if *path* is on a network share (UNC path, mapped network drive, NFS/SMB mount)."""
+    path = os.path.abspath(path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if os.name == "nt":
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        # 4 = DRIVE_REMOTE
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    best, fstype = "", ""
+    for mount_point, kind in mounts:
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fstype = mount_point, kind
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def connect(path: str = COORDINATION_DB) -> sqlite3.Connection:
+    """Open the coordination database (shared by the run lease and the work queue).
+
+    Refuses a path on a network share: SQLite locking is unreliable there, so
+    two hosts could both hold the lease or claim the same user.
+    """
+    if is_network_path(path):
+        raise RuntimeError(f"Coordination database {path} is on a network share; SQLite coordination is "
+                           f"same-host only (use a server-backed OKTA_WORK_QUEUE backend for several hosts)")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    # The work queue checks which batch leaders still hold a lease, so the table always exists
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS leases ("
+        " name TEXT PRIMARY KEY, holder TEXT NOT NULL,"
+        " acquired_at REAL NOT NULL, expires_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class RunLease:
+    """Named lease with heartbeat renewal and stale-lease takeover."""
+
+    def __init__(self, name: str = "provisioning", ttl: float = LEASE_TTL_SECONDS, path: str = COORDINATION_DB):
+        self.name = name
+        self.ttl = ttl
+        self.path = path
+        self.holder = holder_id()
+        self.lost = threading.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+        self.held = False
+        # time.monotonic() of the last successful acquire/renew
+        self._renewed_at = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+        return self._conn
+
+    def current(self) -> Optional[Dict]:
+        """The live lease for this name, if anyone holds one."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT holder, acquired_at, expires_at FROM leases WHERE name = ?", (self.name,)
+            ).fetchone()
+        if not row or row[2] <= time.time():
+            return None
+        return {"holder": row[0], "acquired_at": row[1], "expires_at": row[2]}
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or stale. Starts the heartbeat on success."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row and row[1] > now and row[0] != self.holder:
+                    db.execute("ROLLBACK")
+                    return False
+                if row and row[0] != self.holder:
+                    logger.warning(f"Taking over stale '{self.name}' lease from {row[0]} "
+                                   f"(expired {now - row[1]:.0f}s ago)")
+                db.execute(
+                    "INSERT OR REPLACE INTO leases (name, holder, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.name, self.holder, now, now + self.ttl),
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self.held = True
+        self._renewed_at = time.monotonic()
+        self._stop.clear()
+        self.lost.clear()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name=f"lease-{self.name}", daemon=True)
+        self._heartbeat.start()
+        logger.info(f"Acquired '{self.name}' lease as {self.holder}")
+        return True
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                with self._lock:
+                    renewed = self._db().execute(
+                        "UPDATE leases SET expires_at = ? WHERE name = ? AND holder = ?",
+                        (time.time() + self.ttl, self.name, self.holder),
+                    ).rowcount
+            except sqlite3.Error as e:
+                # Keep trying; the lease is only lost if someone else takes it
+                logger.warning(f"Lease heartbeat failed: {str(e)}")
+                continue
+            if not renewed:
+                logger.error(f"Lost the '{self.name}' lease to another run")
+                self.lost.set()
+                return
+            self._renewed_at = time.monotonic()
+
+    def valid(self) -> bool:
+        """True while the lease is held and was renewed within its TTL.
+
+        A run that stalled (suspended VM, long GC, blocked disk) past the TTL
+        counts as having lost the lease even before the heartbeat notices,
+        since another run may already have taken it over.
+        """
+        if not self.held or self.lost.is_set():
+            return False
+        if time.monotonic() - self._renewed_at >= self.ttl:
+            logger.error(f"'{self.name}' lease not renewed for {self.ttl:g}s; treating it as lost")
+            self.lost.set()
+            return False
+        return True
+
+    def check(self) -> None:
+        """Raise LeaseLost unless the lease is still valid()."""
+        if not self.valid():
+            raise LeaseLost(f"Lost the '{self.name}' lease; another run may have taken over")
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join(timeout=5)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+                self._conn.close()
+                self._conn = None
+        if self.held:
+            self.held = False
+            logger.info(f"Released '{self.name}' lease")
+
+    def __enter__(self) -> "RunLease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
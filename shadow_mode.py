@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Shadow Mode
+Runs the full pipeline (fetch, parse, validate, payload building,
+scheduling) against live read APIs while every write (Okta user/group
+changes, ticket updates, Slack posts) goes to a recording stub with
+simulated latency. Produces a throughput/latency report for capacity
+planning.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+# Simulated write latency in seconds (mean) per host, with +/- jitter as a fraction
+SHADOW_WRITE_LATENCY = {
+    "okta.com": 0.45,
+    "api.samanage.com": 0.6,
+    "slack.com": 0.3,
+}
+DEFAULT_WRITE_LATENCY = 0.4
+LATENCY_JITTER = 0.25
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _endpoint_kind(method: str, url: str) -> str:
+    """Collapse IDs out of a URL so writes group by endpoint ("PUT okta /api/v1/groups/*/users/*")."""
+    parsed = urlparse(url)
+    parts = []
+    for part in parsed.path.strip("/").split("/"):
+        stem = part.split(".")[0]
+        looks_like_id = any(c.isdigit() for c in stem) and stem not in ("v1", "v2")
+        parts.append("*" if looks_like_id else part)
+    host = next((h for h in SHADOW_WRITE_LATENCY if (parsed.hostname or "").endswith(h)), parsed.hostname)
+    return f"{method} {host} /{'/'.join(parts)}"
+
+
+class ShadowRecorder:
+    """Write interceptor that records each write and answers like the real API would."""
+
+    def __init__(self, latency_scale: float = 1.0, seed: Optional[int] = 0):
+        self.latency_scale = latency_scale
+        self.writes: List[Dict] = []
+        self.stages: Dict[str, float] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = None
+
+    def enable(self) -> None:
+        self._started = time.monotonic()
+        http_client.set_write_interceptor(self)
+        logger.info("SHADOW MODE: writes are recorded, not sent")
+
+    def disable(self) -> None:
+        http_client.set_write_interceptor(None)
+
+    def _latency(self, url: str) -> float:
+        host = urlparse(url).hostname or ""
+        mean = next((v for h, v in SHADOW_WRITE_LATENCY.items() if host.endswith(h)), DEFAULT_WRITE_LATENCY)
+        with self._lock:
+            jitter = self._random.uniform(-LATENCY_JITTER, LATENCY_JITTER)
+        return max(0.0, mean * (1 + jitter) * self.latency_scale)
+
+    def __call__(self, method: str, url: str, **kwargs):
+        delay = self._latency(url)
+        time.sleep(delay)
+        status, body = self._fake_reply(method, url, kwargs.get("json"))
+        with self._lock:
+            self.writes.append({
+                "kind": _endpoint_kind(method, url),
+                "latency": delay,
+                "status": status,
+                "at": time.monotonic(),
+            })
+        return http_client.build_response(url, status, json.dumps(body).encode("utf-8"),
+                                          {"Content-Type": "application/json"}, method)
+
+    def _fake_reply(self, method: str, url: str, payload: Optional[Dict]):
+        path = urlparse(url).path
+        if path.startswith("/api/v1/users") and method == "POST":
+            profile = (payload or {}).get("profile", {})
+            return 200, {"id": f"shadow{uuid.uuid4().hex[:14]}", "status": "ACTIVE", "profile": profile}
+        if path.startswith("/api/v1/groups/"):
+            return 204, {}
+        if "slack.com" in url:
+            if path.endswith("files.getUploadURLExternal"):
+                return 200, {"ok": True, "upload_url": "https://files.slack.com/upload/shadow", "file_id": "FSHADOW"}
+            return 200, {"ok": True, "ts": f"{time.time():.6f}"}
+        if path.endswith("/comments.json"):
+            return 201, {}
+        return 200, {}
+
+    def mark(self, stage: str, seconds: float) -> None:
+        """Record how long a pipeline stage took."""
+        self.stages[stage] = seconds
+
+    def report(self, users_processed: int) -> Dict:
+        """Summarise throughput and simulated write latency."""
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        by_kind = defaultdict(list)
+        for write in self.writes:
+            by_kind[write["kind"]].append(write["latency"])
+        provisioning = self.stages.get("provisioning", 0.0)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "users_processed": users_processed,
+            "users_per_minute": round(users_processed / provisioning * 60, 2) if provisioning else 0.0,
+            "writes": len(self.writes),
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            "endpoints": {
+                kind: {
+                    "count": len(latencies),
+                    "p50": round(_percentile(latencies, 50), 3),
+                    "p95": round(_percentile(latencies, 95), 3),
+                    "max": round(max(latencies), 3),
+                }
+                for kind, latencies in sorted(by_kind.items())
+            },
+        }
+
+    def log_report(self, users_processed: int, log: logging.Logger = logger) -> Dict:
+        report = self.report(users_processed)
+        log.info("=" * 60)
+        log.info("SHADOW RUN REPORT")
+        log.info(f"Users processed: {report['users_processed']} "
+                 f"({report['users_per_minute']} users/min through provisioning)")
+        for stage, seconds in report["stages"].items():
+            log.info(f"  Stage {stage}: {seconds:.2f}s")
+        log.info(f"Recorded writes: {report['writes']}")
+        for kind, s in report["endpoints"].items():
+            log.info(f"  {kind}: {s['count']} calls, p50 {s['p50']:.2f}s, p95 {s['p95']:.2f}s, max {s['max']:.2f}s")
+        log.info("=" * 60)
+        return report
@@ -1,162 +1,434 @@
 # slack_integration.py
-import requests
 import json
-from config import get_secret_from_1password
+import http_client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from log_config import console
 
 SLACK_CHANNEL = "codybot_notifications"
+# Channel ID for file uploads; looked up from SLACK_CHANNEL when not set
+SLACK_CHANNEL_ID = None
+SLACK_API_URL = "https://slack.com/api"
+SLACK_POST_URL = f"{SLACK_API_URL}/chat.postMessage"
+
+# "digest" collects users during a run and posts them together on flush();
+# "per_user" posts one message per created user as soon as it is added
+SLACK_NOTIFICATION_MODE = "digest"
+DIGEST_USERS_PER_MESSAGE = 20
+# Slack allows roughly one message per second per channel
+SLACK_MIN_POST_INTERVAL = 1.1
+# Slack rejects messages with more than 50 blocks
+SLACK_MAX_BLOCKS = 50
+# Slack section text is capped at 3000 characters (minus the ``` fence)
+REPORT_SECTION_CHARS = 3000 - 6
+# Keep each report message readable: at most this many characters of report text
+REPORT_MESSAGE_CHARS = 12000
+# Reports that need more messages than this are also uploaded as a file snippet
+REPORT_UPLOAD_AFTER_MESSAGES = 2
+
+_token_lock = threading.Lock()
+_cached_token = None
 
 def get_slack_token() -> str:
-    """Get the Slack bot token from 1Password."""
-    from config import get_secret_from_1password_service_account, get_secret_from_1password
-    try:
-        # Try service account first, fallback to regular CLI
-        return get_secret_from_1password_service_account("op://IT/slack-bot-token/password")
-    except:
-        print("Service account failed, falling back to regular 1Password CLI")
-        return get_secret_from_1password("op://IT/slack-bot-token/password")
+    """Get the Slack bot token from 1Password (fetched once per process)."""
+    global _cached_token
+    with _token_lock:
+        if _cached_token:
+            return _cached_token
+        if http_client.replaying():
+            return http_client.REPLAY_TOKEN
+        from config import get_secret_from_1password_service_account, get_secret_from_1password
+        try:
+            # Try service account first, fallback to regular CLI
+            _cached_token = get_secret_from_1password_service_account("op://IT/slack-bot-token/password")
+        except:
+            console("Service account failed, falling back to regular 1Password CLI")
+            _cached_token = get_secret_from_1password("op://IT/slack-bot-token/password")
+        return _cached_token
 
-def send_slack_notification(user_name: str, work_email: str, title: str, ticket_number: str, ticket_id: str = None) -> bool:
-    """Send a Slack notification about successful Okta user creation."""
-    try:
-        token = get_slack_token()
-        
-        # Use the ticket_id (incident ID) for the IT portal URL, not the ticket_number
-        # Format: https://it.filevine.com/incidents/{ticket_id}-{user-name}-new-user-request
-        user_slug = user_name.lower().replace(" ", "-")
-        incident_id = ticket_id if ticket_id else ticket_number  # Fallback to ticket_number if no ticket_id
-        ticket_url = f"https://it.filevine.com/incidents/{incident_id}-{user_slug}-new-user-request"
-        
-        # Create a nice formatted message
-        message = {
-            "channel": f"#{SLACK_CHANNEL}",
-            "text": f" New Okta User Created",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": " Okta User Created Successfully"
+
+class SlackClient:
+    """Slack client that spaces out posts to stay under the channel rate limit."""
+
+    def __init__(self, channel: str = SLACK_CHANNEL, min_interval: float = SLACK_MIN_POST_INTERVAL):
+        self.channel = channel
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_post = 0.0
+        self._channel_id = SLACK_CHANNEL_ID if channel == SLACK_CHANNEL else None
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {get_slack_token()}",
+            "Content-Type": "application/json"
+        }
+
+    def _wait_for_slot(self):
+        with self._lock:
+            wait = self._last_post + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_post = time.monotonic()
+
+    def post_message(self, message: Dict, timeout: int = 10) -> Optional[Dict]:
+        """Post a chat message and return Slack's JSON reply, or None on failure."""
+        message = dict(message, channel=f"#{self.channel}")
+        for attempt in range(2):
+            self._wait_for_slot()
+            response = http_client.post(SLACK_POST_URL, headers=self._headers(), json=message, timeout=timeout)
+            if response.status_code == 429 and attempt == 0:
+                # Rate limited - honour Retry-After once before giving up
+                time.sleep(int(response.headers.get("Retry-After", "1")))
+                continue
+            break
+
+        if response.status_code != 200:
+            console(f" Slack HTTP error: {response.status_code}")
+            return None
+        result = response.json()
+        if not result.get("ok"):
+            console(f" Slack API error: {result.get('error', 'Unknown error')}")
+            return None
+        return result
+
+    def _api(self, method: str, timeout: int = 15, **kwargs) -> Dict:
+        """Call a Slack Web API method and raise if it does not return ok."""
+        headers = {"Authorization": f"Bearer {get_slack_token()}"}
+        response = http_client.post(f"{SLACK_API_URL}/{method}", headers=headers, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        result = response.json()
+        if not result.get("ok"):
+            raise RuntimeError(f"{method} failed: {result.get('error', 'Unknown error')}")
+        return result
+
+    def channel_id(self) -> str:
+        """Resolve the channel name to the ID that file uploads require."""
+        if self._channel_id:
+            return self._channel_id
+        cursor = None
+        while True:
+            params = {"types": "public_channel,private_channel", "limit": 200, "exclude_archived": True}
+            if cursor:
+                params["cursor"] = cursor
+            result = self._api("conversations.list", data=params)
+            for channel in result.get("channels", []):
+                if channel.get("name") == self.channel:
+                    self._channel_id = channel["id"]
+                    return self._channel_id
+            cursor = result.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                raise RuntimeError(f"Slack channel not found: #{self.channel}")
+
+    def upload_text(self, filename: str, content: str, title: str, initial_comment: str = None) -> bool:
+        """Upload *content* to the channel as a text file snippet."""
+        data = content.encode("utf-8")
+        ticket = self._api("files.getUploadURLExternal", data={"filename": filename, "length": len(data)})
+        upload = http_client.post(ticket["upload_url"], data=data, timeout=30)
+        upload.raise_for_status()
+        complete = {"files": [{"id": ticket["file_id"], "title": title}], "channel_id": self.channel_id()}
+        if initial_comment:
+            complete["initial_comment"] = initial_comment
+        self._api("files.completeUploadExternal", json=complete)
+        return True
+
+
+def build_ticket_url(user_name: str, ticket_number: str, ticket_id: str = None) -> str:
+    """Build the IT portal URL for a new user request ticket."""
+    # Use the ticket_id (incident ID) for the IT portal URL, not the ticket_number
+    # Format: https://it.filevine.com/incidents/{ticket_id}-{user-name}-new-user-request
+    user_slug = user_name.lower().replace(" ", "-")
+    incident_id = ticket_id if ticket_id else ticket_number  # Fallback to ticket_number if no ticket_id
+    return f"https://it.filevine.com/incidents/{incident_id}-{user_slug}-new-user-request"
+
+
+def _user_section(user_name: str, work_email: str, title: str, ticket_number: str, ticket_id: str = None) -> Dict:
+    ticket_url = build_ticket_url(user_name, ticket_number, ticket_id)
+    return {
+        "type": "section",
+        "fields": [
+            {
+                "type": "mrkdwn",
+                "text": f"*Name:*\n{user_name}"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"*Email:*\n{work_email}"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"*Title:*\n{title}"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"*Ticket:*\n<{ticket_url}|#{ticket_number}>"
+            }
+        ]
+    }
+
+
+def build_user_created_message(user_name: str, work_email: str, title: str, ticket_number: str, ticket_id: str = None) -> Dict:
+    """Build the single-user "Okta User Created" message."""
+    return {
+        "channel": f"#{SLACK_CHANNEL}",
+        "text": f" New Okta User Created",
+        "blocks": [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": " Okta User Created Successfully"
+                }
+            },
+            _user_section(user_name, work_email, title, ticket_number, ticket_id),
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"🎫 Ticket status updated to 'In Progress'"
                     }
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Name:*\n{user_name}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Email:*\n{work_email}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Title:*\n{title}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Ticket:*\n<{ticket_url}|#{ticket_number}>"
-                        }
-                    ]
-                },
+                ]
+            }
+        ]
+    }
+
+
+def build_digest_messages(users: List[Dict], users_per_message: int = DIGEST_USERS_PER_MESSAGE) -> List[Dict]:
+    """Split created users into digest messages that stay under Slack's block limit."""
+    # header + context take two blocks, each user takes one section
+    per_message = max(1, min(users_per_message, SLACK_MAX_BLOCKS - 2))
+    total_parts = (len(users) + per_message - 1) // per_message
+    messages = []
+    for part, start in enumerate(range(0, len(users), per_message), 1):
+        chunk = users[start:start + per_message]
+        header = f" {len(users)} Okta Users Created" if len(users) > 1 else " Okta User Created Successfully"
+        if total_parts > 1:
+            header += f" ({part}/{total_parts})"
+        blocks = [{"type": "header", "text": {"type": "plain_text", "text": header}}]
+        blocks.extend(_user_section(**u) for u in chunk)
+        blocks.append({
+            "type": "context",
+            "elements": [
                 {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"🎫 Ticket status updated to 'In Progress'"
-                        }
-                    ]
+                    "type": "mrkdwn",
+                    "text": f"🎫 Ticket status updated to 'In Progress' for {len(chunk)} ticket(s)"
                 }
             ]
+        })
+        messages.append({
+            "channel": f"#{SLACK_CHANNEL}",
+            "text": header.strip(),
+            "blocks": blocks
+        })
+    return messages
+
+
+class SlackNotificationAggregator:
+    """Collect user-created events during a run and post them as rate-limited digests.
+
+    With mode="per_user" every add() posts immediately, as before. With
+    thread_details=True each digest also gets one threaded reply per user.
+    """
+
+    def __init__(self, mode: str = SLACK_NOTIFICATION_MODE, users_per_message: int = DIGEST_USERS_PER_MESSAGE,
+                 thread_details: bool = False, client: SlackClient = None):
+        if mode not in ("digest", "per_user"):
+            raise ValueError(f"Unknown Slack notification mode: {mode}")
+        self.mode = mode
+        self.users_per_message = users_per_message
+        self.thread_details = thread_details
+        self.client = client or SlackClient()
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, user_name: str, work_email: str, title: str, ticket_number: str, ticket_id: str = None) -> bool:
+        """Record a created user. Returns False only if a per-user post fails."""
+        event = {
+            "user_name": user_name,
+            "work_email": work_email,
+            "title": title,
+            "ticket_number": ticket_number,
+            "ticket_id": ticket_id,
         }
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(
-            "https://slack.com/api/chat.postMessage",
-            headers=headers,
-            json=message,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("ok"):
-                print(f"Slack notification sent for {user_name}")
-                return True
-            else:
-                print(f" Slack API error: {result.get('error', 'Unknown error')}")
-                return False
-        else:
-            print(f" Slack HTTP error: {response.status_code}")
+        if self.mode == "per_user":
+            return self._post_user(event)
+        with self._lock:
+            self._pending.append(event)
+        return True
+
+    def _post_user(self, event: Dict, thread_ts: str = None) -> bool:
+        try:
+            message = build_user_created_message(**event)
+            if thread_ts:
+                message["thread_ts"] = thread_ts
+            result = self.client.post_message(message)
+            if result:
+                console(f"Slack notification sent for {event['user_name']}")
+            return result is not None
+        except Exception as e:
+            console(f" Slack notification failed: {str(e)}")
             return False
-            
+
+    def flush(self) -> bool:
+        """Post all pending users as digest messages. Returns True if every post succeeded."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return True
+
+        all_sent = True
+        offset = 0
+        for message in build_digest_messages(pending, self.users_per_message):
+            # header + context blocks wrap one section per user
+            chunk = pending[offset:offset + len(message["blocks"]) - 2]
+            offset += len(chunk)
+            try:
+                result = self.client.post_message(message)
+            except Exception as e:
+                console(f" Slack digest failed: {str(e)}")
+                result = None
+            if result is None:
+                all_sent = False
+                continue
+            if self.thread_details:
+                for event in chunk:
+                    self._post_user(event, thread_ts=result.get("ts"))
+        if all_sent:
+            console("Slack digest sent")
+        return all_sent
+
+
+def send_slack_notification(user_name: str, work_email: str, title: str, ticket_number: str, ticket_id: str = None) -> bool:
+    """Send a Slack notification about successful Okta user creation."""
+    try:
+        result = SlackClient().post_message(
+            build_user_created_message(user_name, work_email, title, ticket_number, ticket_id)
+        )
+        if result:
+            console(f"Slack notification sent for {user_name}")
+            return True
+        return False
+
     except Exception as e:
-        print(f" Slack notification failed: {str(e)}")
+        console(f" Slack notification failed: {str(e)}")
         return False
 
-def send_report_to_slack(report_title: str, report_content: str, report_type: str = "Daily") -> bool:
-    """Send a report to the Slack channel."""
-    try:
-        token = get_slack_token()
-        
-        # Format the report for Slack (trim if too long)
-        max_length = 3000  # Slack message limit consideration
-        if len(report_content) > max_length:
-            truncated_content = report_content[:max_length] + "\n... (report truncated due to length)"
-        else:
-            truncated_content = report_content
-        
-        # Create formatted message for reports
-        message = {
-            "channel": f"#{SLACK_CHANNEL}",
-            "text": f"Okta Automation {report_type} Report",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"Okta Automation {report_type} Report"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"```{truncated_content}```"
-                    }
+def split_report(report_content: str, limit: int = REPORT_SECTION_CHARS) -> List[str]:
+    """Split a report into chunks of at most *limit* characters, breaking on line boundaries."""
+    chunks = []
+    current = []
+    current_len = 0
+    for line in report_content.splitlines():
+        # Very long lines are hard-split so no chunk goes over the limit
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_len = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        added = len(line) + (1 if current else 0)
+        if current and current_len + added > limit:
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+            added = len(line)
+        current.append(line)
+        current_len += added
+    if current:
+        chunks.append("\n".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+def build_report_messages(report_type: str, report_content: str) -> List[Dict]:
+    """Lay a report out as one or more messages of section blocks within Slack's limits."""
+    chunks = split_report(report_content)
+    groups = []
+    group, group_chars = [], 0
+    for chunk in chunks:
+        # One header block per message, so at most SLACK_MAX_BLOCKS - 1 sections
+        if group and (group_chars + len(chunk) > REPORT_MESSAGE_CHARS or len(group) >= SLACK_MAX_BLOCKS - 1):
+            groups.append(group)
+            group, group_chars = [], 0
+        group.append(chunk)
+        group_chars += len(chunk)
+    if group:
+        groups.append(group)
+
+    messages = []
+    for part, group in enumerate(groups, 1):
+        title = f"Okta Automation {report_type} Report"
+        if len(groups) > 1:
+            title += f" ({part}/{len(groups)})"
+        blocks = [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": title
                 }
-            ]
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(
-            "https://slack.com/api/chat.postMessage",
-            headers=headers,
-            json=message,
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("ok"):
-                print(f"Report sent to Slack: {report_type}")
-                return True
-            else:
-                print(f"Slack API error sending report: {result.get('error', 'Unknown error')}")
-                return False
-        else:
-            print(f"Slack HTTP error sending report: {response.status_code}")
-            return False
-            
+            }
+        ]
+        for chunk in group:
+            blocks.append({
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"```{chunk}```"
+                }
+            })
+        messages.append({
+            "channel": f"#{SLACK_CHANNEL}",
+            "text": title,
+            "blocks": blocks
+        })
+    return messages
+
+
+def send_report_to_slack(report_title: str, report_content: str, report_type: str = "Daily",
+                         client: SlackClient = None) -> bool:
+    """Send a report to the Slack channel.
+
+    Long reports are split across as many messages as needed and posted in
+    order through one client. Reports needing more than
+    REPORT_UPLOAD_AFTER_MESSAGES messages are also uploaded in full as a
+    file snippet, concurrently with the messages.
+    """
+    try:
+        client = client or SlackClient()
+        messages = build_report_messages(report_type, report_content)
+
+        upload_future = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if len(messages) > REPORT_UPLOAD_AFTER_MESSAGES:
+                filename = report_title.lower().replace(" ", "_").replace("/", "-") + ".txt"
+                upload_future = executor.submit(
+                    client.upload_text, filename, report_content, report_title,
+                    f"Full {report_type.lower()} report ({len(messages)} parts below)"
+                )
+
+            # Parts are posted one after another so they appear in order
+            sent = 0
+            for message in messages:
+                if client.post_message(message, timeout=15) is None:
+                    break
+                sent += 1
+
+            uploaded = True
+            if upload_future is not None:
+                try:
+                    uploaded = upload_future.result()
+                except Exception as e:
+                    console(f"Report file upload failed: {str(e)}")
+                    uploaded = False
+
+        if sent == len(messages):
+            console(f"Report sent to Slack: {report_type} ({len(messages)} message(s))")
+            return True
+        # The full text still made it if the upload succeeded
+        console(f"Slack report only partly sent: {sent}/{len(messages)} messages")
+        return upload_future is not None and uploaded
+
     except Exception as e:
-        print(f"Failed to send report to Slack: {str(e)}")
+        console(f"Failed to send report to Slack: {str(e)}")
         return False
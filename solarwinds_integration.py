@@ -1,10 +1,11 @@
 # solarwinds_integration.py
-import requests
+import http_client
 from config import get_solarwinds_credentials, SAMANAGE_BASE_URL
+from log_config import console
 
 def get_solarwinds_headers():
     """Get headers for SolarWinds Service Desk API."""
-    token, _ = get_solarwinds_credentials()
+    token = http_client.REPLAY_TOKEN if http_client.replaying() else get_solarwinds_credentials()[0]
     return {
         "X-Samanage-Authorization": f"Bearer {token}",
         "Accept": "application/vnd.samanage.v2.1+json",
@@ -23,9 +24,9 @@ def update_ticket_status_direct(ticket_id: str, ticket_number: str, new_status:
             }
         }
         
-        print(f"Updating ticket {ticket_number} to '{new_status}'...")
+        console(f"Updating ticket {ticket_number} to '{new_status}'...")
         
-        update_response = requests.put(
+        update_response = http_client.put(
             f"{SAMANAGE_BASE_URL}/incidents/{ticket_id}.json",
             json=update_data,
             headers=headers,
@@ -33,15 +34,15 @@ def update_ticket_status_direct(ticket_id: str, ticket_number: str, new_status:
         )
         
         if update_response.status_code in (200, 204):
-            print(f" Updated ticket {ticket_number} status to '{new_status}'")
+            console(f" Updated ticket {ticket_number} status to '{new_status}'")
             return True
         else:
-            print(f" Failed to update ticket {ticket_number}: {update_response.status_code}")
-            print(f"Response: {update_response.text}")
+            console(f" Failed to update ticket {ticket_number}: {update_response.status_code}")
+            console(f"Response: {update_response.text}")
             return False
             
     except Exception as e:
-        print(f" Error updating ticket {ticket_number}: {str(e)}")
+        console(f" Error updating ticket {ticket_number}: {str(e)}")
         return False
 
 def add_ticket_comment_direct(ticket_id: str, ticket_number: str, comment: str) -> bool:
@@ -57,7 +58,7 @@ def add_ticket_comment_direct(ticket_id: str, ticket_number: str, comment: str)
             }
         }
         
-        comment_response = requests.post(
+        comment_response = http_client.post(
             f"{SAMANAGE_BASE_URL}/incidents/{ticket_id}/comments.json",
             json=comment_data,
             headers=headers,
@@ -65,12 +66,12 @@ def add_ticket_comment_direct(ticket_id: str, ticket_number: str, comment: str)
         )
         
         if comment_response.status_code in (200, 201):
-            print(f"Added comment to ticket {ticket_number}")
+            console(f"Added comment to ticket {ticket_number}")
             return True
         else:
-            print(f" Failed to add comment to ticket {ticket_number}")
+            console(f" Failed to add comment to ticket {ticket_number}")
             return False
             
     except Exception as e:
-        print(f" Error adding comment to ticket {ticket_number}: {str(e)}")
+        console(f" Error adding comment to ticket {ticket_number}: {str(e)}")
         return False
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how long the reporting/test entry points take to import, using
+`python -X importtime` in a fresh interpreter, and checks them against a
+budget. Also fails if an entry point pulls in credentials or HTTP clients
+at import time (those must load lazily, on first use).
+
+    python startup_benchmark.py [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+# Cumulative import time budget per entry point, in milliseconds
+STARTUP_BUDGET_MS = {
+    "ticket_extractor": 150,
+    "log_reporter": 100,
+    "send_reports": 100,
+}
+# Modules that mean a 1Password lookup or an HTTP stack was loaded at import time
+HEAVY_MODULES = ("config", "requests", "urllib3", "http_client", "slack_integration")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _import_once(module: str) -> Dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True, timeout=60,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name.split(".")[0])
+        if name == module:
+            cumulative_us = int(match.group(2))
+    return {"ms": (cumulative_us or 0) / 1000.0, "imported": imported}
+
+
+def measure_import(module: str, runs: int = 3) -> Dict:
+    """Import *module* in *runs* fresh interpreters; report the best time and any heavy imports."""
+    samples = [_import_once(module) for _ in range(max(1, runs))]
+    best = min(s["ms"] for s in samples)
+    heavy = sorted(m for m in HEAVY_MODULES if any(m in s["imported"] for s in samples))
+    budget = STARTUP_BUDGET_MS.get(module)
+    return {
+        "module": module,
+        "ms": round(best, 1),
+        "budget_ms": budget,
+        "heavy": heavy,
+        "ok": not heavy and (budget is None or best <= budget),
+    }
+
+
+def run_benchmark(modules: List[str] = None, runs: int = 3) -> List[Dict]:
+    return [measure_import(module, runs) for module in (modules or list(STARTUP_BUDGET_MS))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check CLI import time against the startup budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("modules", nargs="*")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.runs)
+    for r in results:
+        status = "OK  " if r["ok"] else "FAIL"
+        heavy = f"  heavy imports: {', '.join(r['heavy'])}" if r["heavy"] else ""
+        print(f"{status} {r['module']:<20} {r['ms']:>7.1f} ms (budget {r['budget_ms']} ms){heavy}")
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Ticket State Resolution
+Maps the Samanage state IDs in the onboarding view to state names once,
+so fetch_page can ask the server for only the ACTIVE_STATES tickets
+instead of downloading every state and discarding most of it.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from cache_store import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+STATE_CACHE_FILE = "samanage_states.json"
+# State IDs are stable; re-check occasionally in case the workflow is edited
+STATE_CACHE_TTL_DAYS = 30
+
+
+class StateResolver:
+    """State ID -> state name map, filled by probing the incident list and cached on disk.
+
+    A state ID is resolved by fetching one incident in that state and reading
+    its name. IDs with no tickets right now can't be resolved; they stay
+    unresolved (and uncached) and are still sent to the server, so a ticket
+    that later lands in such a state is never missed.
+    """
+
+    def __init__(self, names: Optional[Dict[str, str]] = None, resolved_at: float = 0.0):
+        self.names: Dict[str, str] = names or {}
+        self.resolved_at = resolved_at
+
+    @classmethod
+    def load(cls) -> "StateResolver":
+        data = load_json(STATE_CACHE_FILE, default={}) or {}
+        resolved_at = data.get("resolved_at", 0.0)
+        if time.time() - resolved_at > STATE_CACHE_TTL_DAYS * 86400:
+            return cls()
+        return cls(data.get("names", {}), resolved_at)
+
+    def save(self) -> bool:
+        return save_json(STATE_CACHE_FILE, {"names": self.names, "resolved_at": self.resolved_at})
+
+    def resolve(self, state_ids: Iterable[int], probe: Callable[[int], Optional[str]]) -> int:
+        """Probe every state ID not yet known. Returns how many were newly resolved."""
+        resolved = 0
+        for state_id in state_ids:
+            if str(state_id) in self.names:
+                continue
+            try:
+                name = probe(state_id)
+            except Exception as e:
+                logger.warning(f"Could not probe ticket state {state_id}: {str(e)}")
+                continue
+            if name:
+                self.names[str(state_id)] = name
+                resolved += 1
+        if resolved:
+            if not self.resolved_at:
+                self.resolved_at = time.time()
+            self.save()
+            logger.info(f"Resolved {resolved} ticket state names")
+        return resolved
+
+    def ids_for(self, state_ids: Iterable[int], wanted: Iterable[str]) -> List[int]:
+        """Return the state IDs to query: those named in *wanted*, plus any still unresolved."""
+        wanted = set(wanted)
+        return [sid for sid in state_ids if str(sid) not in self.names or self.names[str(sid)] in wanted]
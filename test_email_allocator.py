@@ -0,0 +1,87 @@
+import unittest
+from email_allocator import EmailAllocator, normalize_name_part
+from ticket_extractor import parse_ticket
+
+
+def _ticket(number, personal_email):
+    return {
+        "id": number,
+        "number": str(number),
+        "state": "New",
+        "created_at": "2025-08-01T09:00:00Z",
+        "custom_fields_values": [
+            {"name": "New Employee Name", "value": "John Smith"},
+            {"name": "New Employee Title", "value": "Engineer"},
+            {"name": "New Employee Department", "value": "IT"},
+            {"name": "New Employee Personal Email", "value": personal_email},
+            {"name": "streetAddress", "value": "123 Main St"},
+            {"name": "city", "value": "Salt Lake City"},
+            {"name": "state", "value": "UT"},
+            {"name": "zipCode", "value": "84101"},
+            {"name": "countryCode", "value": "US"},
+        ],
+    }
+
+
+class TestEmailAllocator(unittest.TestCase):
+    def test_name_normalization(self):
+        self.assertEqual(normalize_name_part("Zoë"), "zoe")
+        self.assertEqual(normalize_name_part("O'Brien"), "obrien")
+        self.assertEqual(normalize_name_part("Smith-Jones"), "smithjones")
+
+    def test_free_login_uses_base(self):
+        allocation = EmailAllocator().allocate("Jane Doe")
+        self.assertEqual(allocation.email, "janedoe@filevine.com")
+        self.assertEqual(allocation.reason, "base")
+
+    def test_same_name_in_one_batch_gets_alternates(self):
+        allocator = EmailAllocator()
+        users = [
+            {"name": "Mary Ann Smith", "ticket_number": "2", "ticket_created": "2025-08-02"},
+            {"name": "Mary Ann Smith", "ticket_number": "1", "ticket_created": "2025-08-01"},
+            {"name": "Mary Ann Smith", "ticket_number": "3", "ticket_created": "2025-08-03"},
+        ]
+        allocations = allocator.allocate_batch(users)
+        # Oldest ticket gets the plain login, later ones get deterministic alternates
+        self.assertEqual(allocations["1"].email, "maryannsmith@filevine.com")
+        self.assertEqual(allocations["2"].email, "maryasmith@filevine.com")
+        self.assertEqual(allocations["3"].email, "maryannsmith2@filevine.com")
+        self.assertEqual(users[0]["work_email"], "maryasmith@filevine.com")
+
+    def test_deprovisioned_login_is_not_reused(self):
+        allocator = EmailAllocator({"janedoe": "DEPROVISIONED", "janedoe2": "ACTIVE"})
+        allocation = allocator.allocate("Jane Doe")
+        self.assertEqual(allocation.email, "janedoe3@filevine.com")
+        self.assertEqual(allocation.reason, "alternate")
+
+    def test_active_login_with_unknown_owner_gets_alternate(self):
+        allocation = EmailAllocator({"janedoe": "ACTIVE"}).allocate("Jane Doe")
+        self.assertEqual(allocation.email, "janedoe2@filevine.com")
+        self.assertEqual(allocation.reason, "alternate")
+
+    def test_same_name_different_person_gets_alternate(self):
+        allocator = EmailAllocator({"johnsmith": "ACTIVE"}, owners={"johnsmith": "john.smith@gmail.com"})
+        allocation = allocator.allocate("John Smith", "jsmith1990@yahoo.com")
+        self.assertEqual(allocation.email, "johnsmith2@filevine.com")
+        self.assertEqual(allocation.reason, "alternate")
+
+    def test_returning_hire_matched_on_personal_email(self):
+        allocator = EmailAllocator({"johnsmith": "ACTIVE", "johnsmith2": "ACTIVE"},
+                                   owners={"johnsmith": "john.smith@gmail.com", "johnsmith2": "jsmith1990@yahoo.com"})
+        allocation = allocator.allocate("John Smith", "JSmith1990@yahoo.com")
+        self.assertEqual(allocation.email, "johnsmith2@filevine.com")
+        self.assertEqual(allocation.reason, "existing")
+
+    def test_parsed_tickets_tell_namesake_from_returning_hire(self):
+        allocator = EmailAllocator({"johnsmith": "ACTIVE"}, owners={"johnsmith": "john.smith@gmail.com"})
+        returning = parse_ticket(_ticket(1, "John.Smith@gmail.com"))
+        namesake = parse_ticket(_ticket(2, "jsmith1990@yahoo.com"))
+        self.assertEqual(returning["personal_email"], "john.smith@gmail.com")
+        allocations = allocator.allocate_batch([returning, namesake])
+        self.assertEqual(allocations["1"].reason, "existing")
+        self.assertEqual(allocations["2"].email, "johnsmith2@filevine.com")
+        self.assertEqual(allocations["2"].reason, "alternate")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import http_client
+from http_client import AdaptiveConcurrencyLimiter
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+    def test_limit_grows_after_a_healthy_window(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial=2, min_limit=1, max_limit=3)
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(0.1, 200)
+        self.assertEqual(limiter.limit, 3)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.1, 200)
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual(limiter.increases, 1)
+
+    def test_errors_cut_the_limit_once_per_cooldown(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial=8, min_limit=1, max_limit=16)
+        for status in (429, 503):
+            limiter.acquire()
+            limiter.release(0.1, status)
+        # The second error falls inside the cooldown, so one burst is one cut
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.decreases, 1)
+
+        limiter._last_decrease -= http_client.DECREASE_COOLDOWN
+        limiter.acquire()
+        limiter.release(0.1, error=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_slot_is_released_when_the_send_raises(self):
+        def broken_interceptor(method, url, **kwargs):
+            raise ValueError("interceptor bug")
+
+        limiter = http_client.limiter_for("https://slot-release.example.com/")
+        http_client.set_write_interceptor(broken_interceptor)
+        try:
+            # More failures than the host has slots: a leaked slot would block acquire() for good
+            for _ in range(limiter.max_limit + 1):
+                with self.assertRaises(ValueError):
+                    http_client.post("https://slot-release.example.com/api")
+        finally:
+            http_client.set_write_interceptor(None)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.completed, limiter.max_limit + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import random
+import unittest
+from incident_stream import iter_json_array, iter_incidents
+
+
+def _chunked(data: bytes, rng: random.Random):
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 7)
+        yield data[pos:pos + size]
+        pos += size
+
+
+class TestIterJsonArray(unittest.TestCase):
+    def test_numbers_split_at_a_chunk_boundary(self):
+        self.assertEqual(list(iter_json_array([b"[12.", b"5]"])), [12.5])
+        self.assertEqual(list(iter_json_array([b"[1.5e", b"10]"])), [1.5e10])
+        self.assertEqual(list(iter_json_array([b"[1", b"2, tr", b"ue, nu", b"ll]"])), [12, True, None])
+
+    def test_random_chunking_round_trip(self):
+        values = [
+            12.5, -0.75, 1.5e10, 3e-7, 0, 123456789, True, False, None, "café – \"quoted\"",
+            {"id": 42, "number": 1001, "custom_fields_values": [{"name": "city", "value": "Salt Lake City"}]},
+            [1, [2.25, {"a": None}], "x"],
+        ]
+        data = json.dumps(values, ensure_ascii=False).encode("utf-8")
+        compact = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        rng = random.Random(1234)
+        for _ in range(200):
+            for document in (data, compact):
+                self.assertEqual(list(iter_json_array(_chunked(document, rng))), values)
+
+    def test_truncated_array_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"id": 1}, 2']))
+
+    def test_incidents_are_projected(self):
+        page = json.dumps([{"id": 1, "number": 7, "description": "x" * 500, "custom_fields_values": [
+            {"name": "city", "value": "Provo", "options": "..."}, {"name": "Laptop", "value": "Mac"}]}]).encode()
+        counter = {}
+        incidents = list(iter_incidents(_chunked(page, random.Random(7)), counter))
+        self.assertEqual(incidents, [{"id": 1, "number": 7,
+                                      "custom_fields_values": [{"name": "city", "value": "Provo"}]}])
+        self.assertEqual(counter["bytes"], len(page))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from onboarding_user import OnboardingUser
+
+
+class TestOnboardingUser(unittest.TestCase):
+    def setUp(self):
+        self.user = OnboardingUser(ticket_number="T-1", name="Jane Q Doe", title="Engineer",
+                                   department="IT", state="UT", manager_email=None)
+
+    def test_reads_like_a_dict(self):
+        self.assertEqual(self.user["name"], "Jane Q Doe")
+        self.assertIn("title", self.user)
+        self.assertIn("manager_email", self.user)
+        self.assertNotIn("city", self.user)
+        self.assertEqual(self.user.get("city", "none"), "none")
+        self.assertEqual(self.user["organization"], "Filevine")
+        with self.assertRaises(KeyError):
+            self.user["city"]
+
+    def test_rejects_unknown_fields(self):
+        with self.assertRaises(KeyError):
+            self.user["nickname"] = "JD"
+
+    def test_constants_are_not_stored_per_record(self):
+        self.assertFalse(hasattr(self.user, "__dict__"))
+        self.assertEqual(OnboardingUser.from_dict(self.user.to_dict()), self.user)
+
+    def test_okta_payload(self):
+        self.user["work_email"] = "janedoe2@filevine.com"
+        payload, email = self.user.to_okta_payload()
+        self.assertEqual(email, "janedoe2@filevine.com")
+        self.assertEqual(payload["profile"]["firstName"], "Jane")
+        self.assertEqual(payload["profile"]["lastName"], "Q Doe")
+        self.assertEqual(payload["profile"]["swrole"], "Requester")
+        self.assertIsNone(payload["profile"]["manager"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import threading
+import unittest
+from slack_integration import (
+    REPORT_SECTION_CHARS,
+    SLACK_MAX_BLOCKS,
+    build_report_messages,
+    send_report_to_slack,
+    split_report,
+)
+
+
+class LocalSlackClient:
+    """Stand-in for SlackClient that records posts and uploads instead of calling Slack."""
+
+    def __init__(self):
+        self.posted = []
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def post_message(self, message, timeout=10):
+        with self._lock:
+            self.posted.append(message)
+        return {"ok": True, "ts": str(len(self.posted))}
+
+    def upload_text(self, filename, content, title, initial_comment=None):
+        with self._lock:
+            self.uploads.append((filename, content, title))
+        return True
+
+
+def make_report(lines):
+    return "\n".join(f"  - user{i}@filevine.com (Ticket #{100000 + i})" for i in range(lines))
+
+
+class TestSlackReportChunking(unittest.TestCase):
+    def test_split_keeps_all_lines_within_limit(self):
+        report = make_report(500)
+        chunks = split_report(report)
+        self.assertTrue(all(len(c) <= REPORT_SECTION_CHARS for c in chunks))
+        self.assertEqual("\n".join(chunks), report)
+
+    def test_long_line_is_hard_split(self):
+        chunks = split_report("x" * (REPORT_SECTION_CHARS * 2 + 10))
+        self.assertEqual([len(c) for c in chunks], [REPORT_SECTION_CHARS, REPORT_SECTION_CHARS, 10])
+
+    def test_messages_stay_under_block_limit(self):
+        messages = build_report_messages("Monthly", make_report(3000))
+        self.assertGreater(len(messages), 1)
+        for part, message in enumerate(messages, 1):
+            self.assertLessEqual(len(message["blocks"]), SLACK_MAX_BLOCKS)
+            self.assertTrue(message["text"].endswith(f"({part}/{len(messages)})"))
+
+    def test_small_report_is_single_message_without_upload(self):
+        client = LocalSlackClient()
+        self.assertTrue(send_report_to_slack("Daily Report", make_report(5), "Daily", client=client))
+        self.assertEqual(len(client.posted), 1)
+        self.assertEqual(client.uploads, [])
+
+    def test_large_report_is_uploaded_and_posted_in_order(self):
+        client = LocalSlackClient()
+        report = make_report(3000)
+        self.assertTrue(send_report_to_slack("Monthly Report", report, "Monthly", client=client))
+        self.assertEqual(len(client.uploads), 1)
+        self.assertEqual(client.uploads[0][1], report)
+        parts = [m["text"] for m in client.posted]
+        self.assertEqual(parts, [m["text"] for m in build_report_messages("Monthly", report)])
+        # Nothing from the report is dropped across the parts
+        posted_text = "\n".join(
+            b["text"]["text"].strip("`") for m in client.posted for b in m["blocks"] if b["type"] == "section"
+        )
+        self.assertEqual(posted_text, report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,14 @@
+import unittest
+from startup_benchmark import STARTUP_BUDGET_MS, measure_import
+
+
+class TestStartupTime(unittest.TestCase):
+    def test_entry_points_do_not_load_credentials_or_http(self):
+        for module in STARTUP_BUDGET_MS:
+            with self.subTest(module=module):
+                result = measure_import(module, runs=1)
+                self.assertEqual(result["heavy"], [], f"{module} imports {result['heavy']} at import time")
+
+
+if __name__ == "__main__":
+    unittest.main()
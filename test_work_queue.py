@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from provisioning_scheduler import ProvisioningScheduler
+from run_lease import RunLease, LeaseLost
+from work_queue import SQLiteWorkQueue
+
+
+def _claim_all(path, worker, claimed):
+    queue = SQLiteWorkQueue.attach(worker, path=path)
+    while True:
+        item = queue.claim()
+        if item is None:
+            break
+        time.sleep(0.005)
+        claimed.put((worker, item["name"]))
+        queue.complete(item, "created")
+    queue.close()
+
+
+class TestSharedWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "coordination.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_worker_processes_each_item_once(self):
+        queue = SQLiteWorkQueue.create("coordinator", path=self.path)
+        for i in range(40):
+            queue.put({"name": f"user{i}"}, (1, f"2026-11-{i % 28 + 1:02d}", float(i), 72))
+        queue.open()
+
+        claimed = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_claim_all, args=(self.path, f"worker{n}", claimed))
+                   for n in range(3)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+
+        names = [claimed.get(timeout=5)[1] for _ in range(40)]
+        self.assertEqual(sorted(names), sorted(f"user{i}" for i in range(40)))
+        self.assertEqual(queue.results()["created"], 40)
+        self.assertEqual(sum(queue.workers().values()), 40)
+        self.assertEqual(queue.pending(), [])
+        queue.close()
+
+    def test_expired_claim_goes_to_another_worker(self):
+        queue = SQLiteWorkQueue.create("coordinator", path=self.path, visibility_timeout=0.2)
+        queue.put({"name": "slow"}, (1,))
+        queue.open()
+        first = SQLiteWorkQueue.attach("first", path=self.path, visibility_timeout=0.2)
+        second = SQLiteWorkQueue.attach("second", path=self.path, visibility_timeout=0.2)
+
+        stuck = first.claim()
+        self.assertIsNone(second.claim())
+        time.sleep(0.3)
+        retried = second.claim()
+        self.assertEqual(retried["name"], "slow")
+        second.complete(retried, "created")
+        # The first worker's late result is ignored
+        first.complete(stuck, "failed")
+        self.assertEqual(queue.results(), {"created": 1})
+        self.assertEqual(queue.workers(), {"second": 1})
+        for q in (queue, first, second):
+            q.close()
+
+    def test_new_batch_leaves_a_live_leaders_batch_alone(self):
+        lease = RunLease(path=self.path)
+        self.assertTrue(lease.acquire())
+        live = SQLiteWorkQueue.create(lease.holder, path=self.path)
+        live.put({"name": "live"}, (1,))
+        live.open()
+        dead = SQLiteWorkQueue.create("crashed-run", path=self.path)
+        dead.put({"name": "orphan"}, (1,))
+        dead.open()
+
+        newer = SQLiteWorkQueue.create("next-run", path=self.path)
+        self.assertTrue(live.is_active())
+        self.assertEqual([u["name"] for u in live.pending()], ["live"])
+        self.assertEqual(dead.pending(), [])
+        for q in (live, dead, newer):
+            q.close()
+        lease.release()
+
+    def test_stalled_lease_stops_the_scheduler(self):
+        lease = RunLease(ttl=0.3, path=self.path)
+        self.assertTrue(lease.acquire())
+        # Simulate a stalled process: no heartbeat renews the lease
+        lease._stop.set()
+        handled = []
+        scheduler = ProvisioningScheduler(lambda user, position, total: handled.append(user) or "created",
+                                          workers=1, lease=lease)
+        scheduler.add({"name": "first"})
+        time.sleep(0.4)
+        scheduler.run()
+        self.assertTrue(scheduler.lease_lost)
+        self.assertEqual(handled, [])
+        with self.assertRaises(LeaseLost):
+            lease.check()
+        lease.release()
+
+    def test_network_share_is_refused(self):
+        with self.assertRaises(RuntimeError):
+            RunLease(path="//fileserver/share/coordination.db").acquire()
+
+    def test_stale_lease_is_taken_over(self):
+        first = RunLease(ttl=0.5, path=self.path)
+        second = RunLease(ttl=0.5, path=self.path)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        # Stop the heartbeat without releasing, as if the first run had crashed
+        first._stop.set()
+        time.sleep(0.7)
+        self.assertTrue(second.acquire())
+        self.assertEqual(second.current()["holder"], second.holder)
+        second.release()
+        first.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
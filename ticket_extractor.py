@@ -1,21 +1,38 @@
 # ticket_extractor.py
 
-import requests
 import logging
-from typing import List, Dict
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Imports and API configuration
-from config import get_samanage_token
+# config (1Password) and http_client (requests) are imported on first use, so
+# parse-only callers and tests don't pay for them
+from log_config import console
+from onboarding_user import OnboardingUser
+from state_resolver import StateResolver
+from incident_stream import iter_incidents
 
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://api.samanage.com"
-# Get the token once at module level
-HEADERS = {
-    "X-Samanage-Authorization": f"Bearer {get_samanage_token()}",
-    "Accept": "application/vnd.samanage.v2.1+json"
-}
+
+_headers_lock = threading.Lock()
+_cached_headers = None
+
+def get_headers() -> Dict[str, str]:
+    """Samanage API headers; the token is fetched once per process, on first use."""
+    global _cached_headers
+    with _headers_lock:
+        if _cached_headers is None:
+            import http_client
+            from config import get_samanage_token
+            token = http_client.REPLAY_TOKEN if http_client.replaying() else get_samanage_token()
+            _cached_headers = {
+                "X-Samanage-Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.samanage.v2.1+json"
+            }
+        return _cached_headers
 
 # Onboarding catalog item ID and state IDs from filtered view
 CATALOG_ITEM_ID = 1198997
@@ -27,6 +44,47 @@ STATE_IDS = [
 # States that represent "open" lifecycle statuses
 ACTIVE_STATES = {"New", "Assigned", "Auto-Assigned"}
 
+# Read incident pages off the wire in chunks of this size
+PAGE_CHUNK_BYTES = 64 * 1024
+
+# Download counters for the current run (see fetch_stats / --measure)
+_stats_lock = threading.Lock()
+_fetch_stats = {"pages": 0, "bytes": 0, "tickets": 0, "used": 0, "refetches": 0}
+# Fetch the pages again this many times when the result set moved during the fan-out
+DRIFT_REFETCHES = 1
+
+REQUIRED_ADDRESS_FIELDS = ["streetAddress", "city", "state", "zipCode", "countryCode"]
+
+# Custom fields that may hold the hire's first day, and the date formats seen in them
+START_DATE_FIELDS = {"Start Date", "New Employee Start Date"}
+START_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%b %d, %Y", "%B %d, %Y")
+# Custom fields that may hold the hire's personal email (becomes Okta secondEmail and
+# tells a returning hire apart from a new one with the same name)
+PERSONAL_EMAIL_FIELDS = {"Personal Email", "New Employee Personal Email", "New Employee Email"}
+
+# Timezone for US users by state
+US_STATE_TIMEZONES = {
+    "CT": "America/New_York", "DE": "America/New_York", "FL": "America/New_York",
+    "GA": "America/New_York", "IN": "America/New_York", "KY": "America/New_York",
+    "MA": "America/New_York", "MD": "America/New_York", "ME": "America/New_York",
+    "MI": "America/New_York", "NC": "America/New_York", "NH": "America/New_York",
+    "NJ": "America/New_York", "NY": "America/New_York", "OH": "America/New_York",
+    "PA": "America/New_York", "RI": "America/New_York", "SC": "America/New_York",
+    "TN": "America/New_York", "VA": "America/New_York", "VT": "America/New_York",
+    "WV": "America/New_York",
+    "AL": "America/Chicago", "AR": "America/Chicago", "IA": "America/Chicago",
+    "IL": "America/Chicago", "KS": "America/Chicago", "LA": "America/Chicago",
+    "MN": "America/Chicago", "MO": "America/Chicago", "MS": "America/Chicago",
+    "ND": "America/Chicago", "NE": "America/Chicago", "OK": "America/Chicago",
+    "SD": "America/Chicago", "TX": "America/Chicago", "WI": "America/Chicago",
+    "CO": "America/Denver", "ID": "America/Denver", "MT": "America/Denver",
+    "NM": "America/Denver", "UT": "America/Denver", "WY": "America/Denver",
+    "AZ": "America/Phoenix",
+    "CA": "America/Los_Angeles", "NV": "America/Los_Angeles",
+    "OR": "America/Los_Angeles", "WA": "America/Los_Angeles",
+    "AK": "America/Anchorage", "HI": "America/Honolulu"
+}
+
 
 def format_phone(phone: str) -> str:
     """Format phone numbers with proper dashes for both US and international numbers."""
@@ -51,41 +109,202 @@ def format_phone(phone: str) -> str:
                 return f"{digits[:3]}-{digits[3:6]}-{digits[6:9]}-{digits[9:]}"
     # If we can't format it nicely, return original
     return phone
-def fetch_page(page: int, per_page: int) -> List[Dict]:
+def _record_fetch(**counts) -> None:
+    with _stats_lock:
+        for key, value in counts.items():
+            _fetch_stats[key] += value
+
+def fetch_stats() -> Dict[str, int]:
+    """Pages, bytes and tickets downloaded this run, and how many tickets were used."""
+    with _stats_lock:
+        return dict(_fetch_stats)
+
+def reset_fetch_stats() -> None:
+    with _stats_lock:
+        for key in _fetch_stats:
+            _fetch_stats[key] = 0
+
+def _probe_state(state_id: int) -> Optional[str]:
+    """Name of a state ID, read from one onboarding ticket in that state (None if there are none)."""
+    import http_client
+    params = {"per_page": 1, "page": 1, "catalog_item_id": CATALOG_ITEM_ID, "state_id[]": [state_id]}
+    resp = http_client.get(f"{BASE_URL}/incidents.json", headers=get_headers(), params=params, timeout=30)
+    if resp.status_code != 200:
+        raise RuntimeError(f"status {resp.status_code}")
+    incidents = resp.json()
+    return incidents[0].get("state") if incidents else None
+
+def active_state_ids() -> List[int]:
+    """The STATE_IDS whose names are in ACTIVE_STATES (plus any not yet resolved)."""
+    resolver = StateResolver.load()
+    resolver.resolve(STATE_IDS, _probe_state)
+    state_ids = resolver.ids_for(STATE_IDS, ACTIVE_STATES)
+    logger.info(f"Querying {len(state_ids)} of {len(STATE_IDS)} ticket states")
+    return state_ids
+
+def fetch_page(page: int, per_page: int, state_ids: Optional[List[int]] = None) -> List[Dict]:
     params = {
         "per_page": per_page,
         "page": page,
         "catalog_item_id": CATALOG_ITEM_ID,
+        "state_id[]": list(state_ids if state_ids is not None else STATE_IDS),
     }
-    for sid in STATE_IDS:
-        params.setdefault("state_id[]", []).append(sid)
 
     # Only log to file, not console
     logger.debug(f"📡 Fetching page {page}...")
-    resp = requests.get(f"{BASE_URL}/incidents.json", headers=HEADERS, params=params)
+    import http_client
+    headers = {**get_headers(), "Accept-Encoding": "gzip"}
+    # Decode one incident at a time, keeping only what parse_ticket needs. Pages are not
+    # put in the HTTP cache: it would read each page in full and keep the raw tickets
+    # (requester names, addresses) on disk
+    resp = http_client.get(f"{BASE_URL}/incidents.json", headers=headers, params=params, timeout=30,
+                           stream=True)
+    try:
+        if resp.status_code != 200:
+            console(f" Error on page {page}: {resp.status_code}: {resp.text}")
+            return []
 
-    if resp.status_code != 200:
-        print(f" Error on page {page}: {resp.status_code}: {resp.text}")
-        return []
+        counter = {"bytes": 0}
+        incidents = list(iter_incidents(resp.iter_content(chunk_size=PAGE_CHUNK_BYTES), counter))
+    finally:
+        resp.close()
+    _record_fetch(pages=1, bytes=counter["bytes"], tickets=len(incidents))
+    return incidents
 
-    return resp.json()
+def _created_key(ticket: Dict):
+    """Sort key: oldest created_at first (offset-aware), then ticket id."""
+    created = ticket.get("created_at")
+    try:
+        stamp = datetime.fromisoformat(str(created).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        stamp = float("inf")
+    return stamp, str(ticket.get("id"))
+
+def merge_pages(pages: Dict[int, Optional[List[Dict]]], per_page: int) -> Tuple[List[Dict], List[str]]:
+    """Merge concurrently fetched pages into one de-duplicated, oldest-first list.
+
+    Returns (tickets, drift) where *drift* lists signs that the result set
+    moved while it was being paged through: the same ticket on two pages,
+    a short page followed by a non-empty one, or a page that failed. Any of
+    these means a ticket may have been skipped.
+    """
+    by_id: Dict = {}
+    drift = []
+    seen_short = None
+    for page in sorted(pages):
+        incidents = pages[page]
+        if incidents is None:
+            drift.append(f"page {page} failed")
+            continue
+        if incidents and seen_short is not None:
+            drift.append(f"page {seen_short} was short but page {page} had tickets")
+            seen_short = None
+        if len(incidents) < per_page and seen_short is None:
+            seen_short = page
+        for ticket in incidents:
+            ticket_id = ticket.get("id")
+            previous = by_id.get(ticket_id)
+            if previous is None:
+                by_id[ticket_id] = ticket
+                continue
+            drift.append(f"ticket {ticket_id} on more than one page")
+            # Keep the most recently updated copy
+            if str(ticket.get("updated_at", "")) > str(previous.get("updated_at", "")):
+                by_id[ticket_id] = ticket
+    return sorted(by_id.values(), key=_created_key), drift
 
-def fetch_tickets(per_page: int = 100, max_pages: int = 40, workers: int = 30) -> List[Dict]:
-    all_tickets = []
+def _fetch_pages(per_page: int, max_pages: int, workers: int, state_ids: List[int]) -> Dict[int, Optional[List[Dict]]]:
+    pages: Dict[int, Optional[List[Dict]]] = {}
     with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(fetch_page, page, per_page) for page in range(1, max_pages + 1)]
+        futures = {executor.submit(fetch_page, page, per_page, state_ids): page for page in range(1, max_pages + 1)}
         for future in as_completed(futures):
             try:
-                incidents = future.result()
-                all_tickets.extend(incidents)
+                pages[futures[future]] = future.result()
             except Exception as e:
-                print(f" Thread error: {e}")
+                console(f" Thread error: {e}")
+                pages[futures[future]] = None
+    return pages
+
+def fetch_tickets(per_page: int = 100, max_pages: int = 40, workers: Optional[int] = None,
+                  state_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Fetch onboarding tickets, de-duplicated by id and ordered oldest first.
+
+    By default only ACTIVE_STATES are requested from the server. If the
+    pages drifted while they were fetched, they are fetched once more and
+    both passes are merged.
+    """
+    import http_client
+    if state_ids is None:
+        state_ids = active_state_ids()
+    # The shared Samanage limiter decides how many pages are actually in flight;
+    # the pool only needs to be big enough to reach its ceiling
+    workers = workers or http_client.max_concurrency(BASE_URL)
+    pages = _fetch_pages(per_page, max_pages, workers, state_ids)
+    all_tickets, drift = merge_pages(pages, per_page)
 
-    print(f"Total tickets fetched: {len(all_tickets)}")
+    for _ in range(DRIFT_REFETCHES):
+        if not drift:
+            break
+        logger.warning(f"Ticket pages drifted during fetch ({'; '.join(drift[:5])}"
+                       f"{'; ...' if len(drift) > 5 else ''}), fetching again")
+        _record_fetch(refetches=1)
+        again = _fetch_pages(per_page, max_pages, workers, state_ids)
+        # Union of both passes: anything skipped by one pass is picked up by the other
+        combined = {page: incidents for page, incidents in pages.items() if incidents is not None}
+        for page, incidents in again.items():
+            if incidents is not None:
+                combined[max_pages + page] = incidents
+        all_tickets, _ = merge_pages(combined, per_page)
+        drift = merge_pages(again, per_page)[1]
+        pages = again
+
+    if drift:
+        logger.warning(f"Ticket pages still drifting after {DRIFT_REFETCHES} re-fetch; the next run will catch up")
+    if pages.get(max_pages) and len(pages[max_pages]) == per_page:
+        logger.warning(f"All {max_pages} pages were full; some tickets may not have been fetched")
+
+    console(f"Total tickets fetched: {len(all_tickets)}")
     return all_tickets
 
-def parse_ticket(ticket: Dict) -> Dict:
-    """Parse a ticket with validation and error handling."""
+def fetch_ticket(ticket_id) -> Optional[Dict]:
+    """Fetch a single incident by ID (used for webhook events). Returns None if it can't be read."""
+    import http_client
+    resp = http_client.get(f"{BASE_URL}/incidents/{ticket_id}.json", headers=get_headers(), timeout=30)
+    if resp.status_code != 200:
+        logger.warning(f"Could not fetch ticket {ticket_id}: {resp.status_code}")
+        return None
+    return resp.json()
+
+def is_onboarding_ticket(ticket: Dict) -> bool:
+    """True for open tickets from the onboarding catalog item.
+
+    Tickets from fetch_tickets are already filtered by catalog item; single
+    tickets from webhooks are checked here when the field is present.
+    """
+    catalog_item = ticket.get("catalog_item") or {}
+    if catalog_item.get("id") and catalog_item.get("id") != CATALOG_ITEM_ID:
+        return False
+    return ticket.get("state") in ACTIVE_STATES
+
+def parse_start_date(value) -> Optional[str]:
+    """Normalize a start date custom field to YYYY-MM-DD (None if it can't be read)."""
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip()
+    try:
+        # ISO dates and timestamps ("2026-11-03", "2026-11-03T00:00:00.000-07:00")
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in START_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def parse_ticket(ticket: Dict) -> OnboardingUser:
+    """Parse a ticket into an OnboardingUser ({} if the ticket can't be used)."""
     try:
         # Validate ticket has minimum required fields
         if not isinstance(ticket, dict):
@@ -93,18 +312,15 @@ def parse_ticket(ticket: Dict) -> Dict:
         if not ticket.get("number"):
             raise ValueError("Ticket is missing required field: number")
 
-        out = {
-            "ticket_id": ticket.get("id"),
-            "ticket_number": ticket.get("number"),
-            "ticket_state": ticket.get("state", "Unknown"),
-            "ticket_created": ticket.get("created_at", "Unknown"),
-            "preferredLanguage": "en",
-            "organization": "Filevine",
-            "swrole": "Requester",
-            "primary": True,
-            "timezone": "America/Denver",
-            "countryCode": "US"
-        }
+        # organization, swrole, primary and preferredLanguage are class-level constants
+        out = OnboardingUser(
+            ticket_id=ticket.get("id"),
+            ticket_number=ticket.get("number"),
+            ticket_state=ticket.get("state", "Unknown"),
+            ticket_created=ticket.get("created_at", "Unknown"),
+            timezone="America/Denver",
+            countryCode="US"
+        )
 
         # Parse custom_fields_values as a list of dicts
 
@@ -129,6 +345,13 @@ def parse_ticket(ticket: Dict) -> Dict:
                     out["zipCode"] = fval
                 elif fname == "countryCode" or fname.startswith("countryCode - Formatted"):
                     out["countryCode"] = fval
+                elif fname in PERSONAL_EMAIL_FIELDS:
+                    if fval and "@" in str(fval):
+                        out["personal_email"] = str(fval).strip().lower()
+                elif fname in START_DATE_FIELDS:
+                    start_date = parse_start_date(fval)
+                    if start_date:
+                        out["start_date"] = start_date
                 elif fname == "Reports to":
                     # Try to extract manager email if present
                     user_obj = field.get("user")
@@ -154,37 +377,15 @@ def parse_ticket(ticket: Dict) -> Dict:
             return {}
 
         # Validate required address fields
-        required_address_fields = ["streetAddress", "city", "state", "zipCode", "countryCode"]
-        missing_address = [f for f in required_address_fields if not out.get(f)]
+        missing_address = [f for f in REQUIRED_ADDRESS_FIELDS if not out.get(f)]
         if missing_address:
             logger.warning(f"Ticket {out.get('ticket_number')} missing address fields: {', '.join(missing_address)}. Skipping user creation.")
             return {}
 
         # Calculate timezone from state and countryCode
-        us_state_timezones = {
-            "CT": "America/New_York", "DE": "America/New_York", "FL": "America/New_York",
-            "GA": "America/New_York", "IN": "America/New_York", "KY": "America/New_York",
-            "MA": "America/New_York", "MD": "America/New_York", "ME": "America/New_York",
-            "MI": "America/New_York", "NC": "America/New_York", "NH": "America/New_York",
-            "NJ": "America/New_York", "NY": "America/New_York", "OH": "America/New_York",
-            "PA": "America/New_York", "RI": "America/New_York", "SC": "America/New_York",
-            "TN": "America/New_York", "VA": "America/New_York", "VT": "America/New_York",
-            "WV": "America/New_York",
-            "AL": "America/Chicago", "AR": "America/Chicago", "IA": "America/Chicago",
-            "IL": "America/Chicago", "KS": "America/Chicago", "LA": "America/Chicago",
-            "MN": "America/Chicago", "MO": "America/Chicago", "MS": "America/Chicago",
-            "ND": "America/Chicago", "NE": "America/Chicago", "OK": "America/Chicago",
-            "SD": "America/Chicago", "TX": "America/Chicago", "WI": "America/Chicago",
-            "CO": "America/Denver", "ID": "America/Denver", "MT": "America/Denver",
-            "NM": "America/Denver", "UT": "America/Denver", "WY": "America/Denver",
-            "AZ": "America/Phoenix",
-            "CA": "America/Los_Angeles", "NV": "America/Los_Angeles",
-            "OR": "America/Los_Angeles", "WA": "America/Los_Angeles",
-            "AK": "America/Anchorage", "HI": "America/Honolulu"
-        }
         if out.get("countryCode", "US") == "US":
             state = out.get("state", "UT")
-            out["timezone"] = us_state_timezones.get(state, "America/Denver")
+            out["timezone"] = US_STATE_TIMEZONES.get(state, "America/Denver")
         elif out.get("countryCode") == "SK":
             out["timezone"] = "Europe/Bratislava"
         elif out.get("countryCode") == "CZ":
@@ -194,12 +395,12 @@ def parse_ticket(ticket: Dict) -> Dict:
 
         return out
     except Exception as e:
-        print(f" Critical error parsing ticket {ticket.get('number', 'Unknown')}: {str(e)}")
+        console(f" Critical error parsing ticket {ticket.get('number', 'Unknown')}: {str(e)}")
         return {}
 
         return out
     except Exception as e:
-        print(f" Critical error parsing ticket {ticket.get('number', 'Unknown')}: {str(e)}")
+        console(f" Critical error parsing ticket {ticket.get('number', 'Unknown')}: {str(e)}")
         return {}
 
     if "name" not in out:
@@ -207,27 +408,28 @@ def parse_ticket(ticket: Dict) -> Dict:
 
     return out
 
-def filter_onboarding_users(tickets: List[Dict]) -> List[Dict]:
+def filter_onboarding_users(tickets: List[Dict], parse_cache=None) -> List[OnboardingUser]:
+    """Parse the tickets in ACTIVE_STATES; unchanged tickets come from *parse_cache* (a ParseCache) if given."""
     def should_parse(t: Dict) -> bool:
         return t.get("state") in ACTIVE_STATES
 
     filtered = [t for t in tickets if should_parse(t)]
 
+    # Parsing is pure CPU work with no I/O, so a thread pool only adds overhead
     users = []
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(parse_ticket, t): t for t in filtered}
-        for future in as_completed(futures):
-            try:
-                u = future.result()
-                if u and "title" in u and "department" in u:
-                    users.append(u)
-            except Exception as e:
-                print(f" Parse error: {e}")
+    for t in filtered:
+        try:
+            u = parse_cache.parse(t, parse_ticket) if parse_cache else parse_ticket(t)
+            if u and "title" in u and "department" in u:
+                users.append(u)
+        except Exception as e:
+            console(f" Parse error: {e}")
 
-    print(f"\nFinal parsed onboarding users: {len(users)} of {len(tickets)} tickets")
+    _record_fetch(used=len(filtered))
+    console(f"\nFinal parsed onboarding users: {len(users)} of {len(tickets)} tickets")
     return users
 
-def print_users(users: List[Dict]):
+def print_users(users: List[OnboardingUser]):
     for i, u in enumerate(users, 1):
         print(f"\n--- User #{i} ---")
         print(f"Ticket #: {u.get('ticket_number')} | Created: {u.get('ticket_created')} | State: {u.get('ticket_state')}")
@@ -235,8 +437,24 @@ def print_users(users: List[Dict]):
             if k not in ("ticket_number", "ticket_state", "ticket_created"):
                 print(f"{k:>16}: {v}")
 
+def measure_fetch(per_page: int = 100, max_pages: int = 40) -> Dict[str, Dict[str, int]]:
+    """Fetch once with every STATE_ID and once with only the active ones; return both fetch_stats."""
+    results = {}
+    for label, state_ids in (("all_states", STATE_IDS), ("active_states", None)):
+        reset_fetch_stats()
+        filter_onboarding_users(fetch_tickets(per_page, max_pages, state_ids=state_ids))
+        results[label] = fetch_stats()
+    return results
+
 if __name__ == "__main__":
+    import sys
     try:
+        if "--measure" in sys.argv:
+            # Bytes and tickets downloaded vs used, with and without server-side state filtering
+            for label, s in measure_fetch().items():
+                print(f"{label:>14}: {s['pages']} pages, {s['bytes'] / 1024:.0f} KB, "
+                      f"{s['tickets']} tickets downloaded, {s['used']} used")
+            sys.exit(0)
         tickets = fetch_tickets()
         users = filter_onboarding_users(tickets)
         print(f"\nParsed onboarding users: {len(users)}")
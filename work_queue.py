@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Provisioning Work Queues
+Where ProvisioningScheduler keeps the users waiting to be created.
+
+MemoryWorkQueue is the in-process heap a single run uses. Shared backends
+hold one batch that several processes claim from: the
+coordinator creates the batch, put()s every user and open()s it; workers
+attach() and claim. A claim is hidden from other workers for a visibility
+timeout; if the worker does not complete it in time (crashed, killed, lost
+its network) the item becomes claimable again.
+
+SQLiteWorkQueue is the built-in shared backend, for processes on one host
+(SQLite locking is not safe on network shares). A backend that spans hosts
+registers in QUEUE_BACKENDS and is picked with OKTA_WORK_QUEUE.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from run_lease import connect, COORDINATION_DB
+
+logger = logging.getLogger(__name__)
+
+# Batch lifecycle: filling (coordinator still adding) -> open (claimable) -> stopped / finished
+BATCH_FILLING = "filling"
+BATCH_OPEN = "open"
+BATCH_STOPPED = "stopped"
+BATCH_FINISHED = "finished"
+# Seconds to wait for other workers to finish the users they claimed
+CLAIM_WAIT_SECONDS = 300
+# A claim not completed within this many seconds is handed to another worker
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("OKTA_QUEUE_VISIBILITY_TIMEOUT", "300"))
+# An item whose claim expired this many times is recorded as failed instead of handed out again
+MAX_ATTEMPTS = 3
+# Bump when the tables change; coordination data is per-run, so old tables are simply dropped
+QUEUE_SCHEMA = 2
+
+
+class WorkQueue:
+    """Interface ProvisioningScheduler works against.
+
+    Items come out of claim() most urgent first (smallest key) and go back
+    in through complete() with a result label. Shared backends also
+    provide the create(coordinator, decode) and attach(worker, decode)
+    classmethods.
+    """
+
+    def put(self, item, key: Tuple) -> None:
+        raise NotImplementedError
+
+    def open(self) -> None:
+        """Every item has been added; claims may start."""
+
+    def claim(self):
+        """Next item, or None when the queue is empty or stopped."""
+        raise NotImplementedError
+
+    def complete(self, item, result: str) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        """No more claims; items already claimed still complete."""
+        raise NotImplementedError
+
+    def wait_idle(self, timeout: float = CLAIM_WAIT_SECONDS) -> bool:
+        """Wait until no other worker holds a live claim. False if some are still out after *timeout*."""
+        return True
+
+    def is_active(self) -> bool:
+        """True until the queue is stopped or finished."""
+        raise NotImplementedError
+
+    def results(self) -> Counter:
+        raise NotImplementedError
+
+    def workers(self) -> Counter:
+        """Completed items per worker."""
+        return Counter()
+
+    def pending(self) -> List:
+        """Items not completed, most urgent first."""
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Close the batch for good."""
+
+    def close(self) -> None:
+        """Release connections."""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryWorkQueue(WorkQueue):
+    """In-process priority queue (smallest key first, insertion order on ties)."""
+
+    def __init__(self):
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._results: Counter = Counter()
+
+    def put(self, item, key: Tuple) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (key, next(self._seq), item))
+
+    def claim(self):
+        with self._lock:
+            if self._stopped or not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def complete(self, item, result: str) -> None:
+        with self._lock:
+            self._results[result] += 1
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+
+    def is_active(self) -> bool:
+        with self._lock:
+            return not self._stopped
+
+    def results(self) -> Counter:
+        with self._lock:
+            return Counter(self._results)
+
+    def pending(self) -> List:
+        with self._lock:
+            return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2])]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """One provisioning batch in the coordination database, claimable from any process.
+
+    Items are stored as JSON dicts and come back through *decode* (e.g.
+    OnboardingUser.from_dict). Every claim carries a token, so a worker
+    whose claim expired and was handed to someone else cannot overwrite
+    the new owner's result.
+    """
+
+    def __init__(self, batch_id: str, worker: str, decode: Optional[Callable] = None, path: str = COORDINATION_DB,
+                 visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS):
+        self.batch_id = batch_id
+        self.worker = worker
+        self.decode = decode or (lambda data: data)
+        self.visibility_timeout = visibility_timeout
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # id(item) -> (row seq, claim token) for items this process has claimed
+        self._claims: Dict[int, Tuple[int, str]] = {}
+        self._ensure_schema()
+
+    def _ensure_schema(self) -> None:
+        with self._lock:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < QUEUE_SCHEMA:
+                self._conn.executescript("DROP TABLE IF EXISTS items; DROP TABLE IF EXISTS batches;")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " id TEXT PRIMARY KEY, leader TEXT, status TEXT NOT NULL, created_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS items ("
+                " batch_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+                " p0, p1, p2, p3, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending', worker TEXT, token TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                " claimed_at REAL, visible_at REAL, result TEXT,"
+                " PRIMARY KEY (batch_id, seq));"
+                "CREATE INDEX IF NOT EXISTS items_pending ON items (batch_id, status, p0, p1, p2, p3, seq);"
+                f"PRAGMA user_version = {QUEUE_SCHEMA};"
+            )
+
+    @classmethod
+    def create(cls, leader: str, decode: Optional[Callable] = None, path: str = COORDINATION_DB,
+               **options) -> "SQLiteWorkQueue":
+        """Start a new batch owned by *leader*.
+
+        Batches whose leader no longer holds a live lease are stopped, and
+        dropped once none of their items is still claimed by a live worker.
+        A batch whose leader is still live is never touched.
+        """
+        queue = cls(uuid.uuid4().hex, leader, decode, path, **options)
+        with queue._lock:
+            db = queue._conn
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                stale = "leader NOT IN (SELECT holder FROM leases WHERE expires_at > ?)"
+                db.execute(f"UPDATE batches SET status = ? WHERE {stale} AND status IN (?, ?)",
+                           (BATCH_STOPPED, now, BATCH_FILLING, BATCH_OPEN))
+                droppable = (f"SELECT id FROM batches WHERE {stale} AND NOT EXISTS ("
+                             "SELECT 1 FROM items WHERE items.batch_id = batches.id"
+                             " AND items.status = 'claimed' AND items.visible_at > ?)")
+                db.execute(f"DELETE FROM items WHERE batch_id IN ({droppable})", (now, now))
+                db.execute(f"DELETE FROM batches WHERE id IN ({droppable})", (now, now))
+                db.execute("INSERT INTO batches (id, leader, status, created_at) VALUES (?, ?, ?, ?)",
+                           (queue.batch_id, leader, BATCH_FILLING, time.time()))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return queue
+
+    @classmethod
+    def attach(cls, worker: str, decode: Optional[Callable] = None, path: str = COORDINATION_DB,
+               **options) -> Optional["SQLiteWorkQueue"]:
+        """The open batch, if a leader has published one."""
+        probe = cls("", worker, decode, path, **options)
+        with probe._lock:
+            row = probe._conn.execute(
+                "SELECT id FROM batches WHERE status = ? ORDER BY created_at DESC LIMIT 1", (BATCH_OPEN,)
+            ).fetchone()
+        if not row:
+            probe.close()
+            return None
+        probe.batch_id = row[0]
+        return probe
+
+    def _status(self) -> Optional[str]:
+        row = self._conn.execute("SELECT status FROM batches WHERE id = ?", (self.batch_id,)).fetchone()
+        return row[0] if row else None
+
+    def _set_status(self, status: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE batches SET status = ? WHERE id = ?", (status, self.batch_id))
+
+    def put(self, item, key: Tuple) -> None:
+        p = (tuple(key) + (None,) * 4)[:4]
+        payload = json.dumps(item.to_dict() if hasattr(item, "to_dict") else dict(item), default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO items (batch_id, seq, p0, p1, p2, p3, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.batch_id, next(self._seq)) + p + (payload,),
+            )
+
+    def open(self) -> None:
+        self._set_status(BATCH_OPEN)
+
+    def claim(self):
+        """Take the most urgent pending (or expired) item, or None when there is none or the batch is closed."""
+        with self._lock:
+            db = self._conn
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = None
+                while self._status() == BATCH_OPEN:
+                    now = time.time()
+                    row = db.execute(
+                        "SELECT seq, payload, attempts, worker FROM items WHERE batch_id = ?"
+                        " AND (status = 'pending' OR (status = 'claimed' AND visible_at <= ?))"
+                        " ORDER BY p0, p1, p2, p3, seq LIMIT 1", (self.batch_id, now)
+                    ).fetchone()
+                    if row is None or row[2] < MAX_ATTEMPTS:
+                        break
+                    # Claimed and abandoned too many times: record it instead of handing it out forever
+                    logger.warning(f"Queue item {row[0]} expired {row[2]} times (last worker {row[3]}); marking failed")
+                    db.execute("UPDATE items SET status = 'done', result = 'failed' WHERE batch_id = ? AND seq = ?",
+                               (self.batch_id, row[0]))
+                    row = None
+                if row:
+                    if row[2]:
+                        logger.info(f"Reclaiming queue item {row[0]} from {row[3]} (claim expired)")
+                    token = uuid.uuid4().hex
+                    db.execute("UPDATE items SET status = 'claimed', worker = ?, token = ?, attempts = attempts + 1,"
+                               " claimed_at = ?, visible_at = ? WHERE batch_id = ? AND seq = ?",
+                               (self.worker, token, now, now + self.visibility_timeout, self.batch_id, row[0]))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            if not row:
+                return None
+            item = self.decode(json.loads(row[1]))
+            self._claims[id(item)] = (row[0], token)
+        return item
+
+    def complete(self, item, result: str) -> None:
+        with self._lock:
+            claim = self._claims.pop(id(item), None)
+            if claim is None:
+                return
+            updated = self._conn.execute(
+                "UPDATE items SET status = 'done', result = ? WHERE batch_id = ? AND seq = ? AND token = ?",
+                (result, self.batch_id) + claim
+            ).rowcount
+        if not updated:
+            logger.warning(f"Claim on queue item {claim[0]} expired before it completed; result '{result}' not recorded")
+
+    def stop(self) -> None:
+        self._set_status(BATCH_STOPPED)
+
+    def wait_idle(self, timeout: float = CLAIM_WAIT_SECONDS) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                claimed = self._conn.execute(
+                    "SELECT COUNT(*) FROM items WHERE batch_id = ? AND status = 'claimed' AND visible_at > ?",
+                    (self.batch_id, time.time())
+                ).fetchone()[0]
+            if not claimed:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(1)
+
+    def is_active(self) -> bool:
+        with self._lock:
+            return self._status() in (BATCH_FILLING, BATCH_OPEN)
+
+    def results(self) -> Counter:
+        """Result counts across every process that worked on the batch."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result, COUNT(*) FROM items WHERE batch_id = ? AND status = 'done' GROUP BY result",
+                (self.batch_id,)
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def workers(self) -> Counter:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker, COUNT(*) FROM items WHERE batch_id = ? AND status = 'done' GROUP BY worker",
+                (self.batch_id,)
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def pending(self) -> List:
+        """Items not completed (never claimed, or claimed by a worker that did not report back)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM items WHERE batch_id = ? AND status != 'done'"
+                " ORDER BY p0, p1, p2, p3, seq", (self.batch_id,)
+            ).fetchall()
+        return [self.decode(json.loads(row[0])) for row in rows]
+
+    def finish(self) -> None:
+        self._set_status(BATCH_FINISHED)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        """Items a claim could return right now (pending, or claimed and expired)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM items WHERE batch_id = ?"
+                " AND (status = 'pending' OR (status = 'claimed' AND visible_at <= ?))",
+                (self.batch_id, time.time())
+            ).fetchone()[0]
+
+
+# Shared backends by name; OKTA_WORK_QUEUE picks the one coordinator and workers use
+QUEUE_BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+def shared_queue_backend(name: Optional[str] = None):
+    """The shared WorkQueue class named by *name* or OKTA_WORK_QUEUE (default sqlite)."""
+    name = name or os.getenv("OKTA_WORK_QUEUE", "sqlite")
+    if name not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown work queue backend '{name}' (available: {', '.join(QUEUE_BACKENDS)})")
+    return QUEUE_BACKENDS[name]